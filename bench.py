@@ -0,0 +1,256 @@
+"""Offline benchmark: main.py handlerlarini soxta Update va Bot bilan o'lchash.
+
+Telegramga ulanmaydi. Har bir foydalanuvchilar soni uchun vaqtinchalik papkada
+users.json yaratiladi, bot shu papkadan yuklanadi va handlerlar ketma-ket
+chaqiriladi. Natijada har bir stsenariy uchun p50/p99 kechikish va o'tkazuvchanlik
+chiqadi.
+
+Ishlatish:
+    python bench.py
+    python bench.py --users 1000 100000 --requests 2000 --skip-broadcast
+    python bench.py --users 1000000 --memory   # yuklangan storage egallagan xotira
+    python bench.py --users 1000000 --binary   # users.bin dan yuklash (sovuq start)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BASE_USER_ID = 10 ** 9
+COUPONS = 20
+
+# ------------------- SOXTA TELEGRAM OBYEKTLARI -------------------
+class FakeBot:
+    """Chiquvchi Bot API chaqiruvlarini yozib boradigan soxta bot"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.next_message_id = 1
+
+    async def _record(self, method: str, chat_id=0, **kwargs):
+        self.calls[method] += 1
+        self.next_message_id += 1
+        return FakeMessage(self, chat_id, message_id=self.next_message_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._record("sendMessage", chat_id)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._record("sendPhoto", chat_id)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._record("sendDocument", chat_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return await self._record("editMessageText", chat_id)
+
+    async def answer_callback_query(self, callback_query_id, **kwargs):
+        self.calls["answerCallbackQuery"] += 1
+        return True
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, message_id: int = 1, text: str = None, photo=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.photo = photo
+        self.caption = None
+        self.document = None
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(self.chat_id, text, **kwargs)
+
+    async def reply_photo(self, photo, **kwargs):
+        return await self.bot.send_photo(self.chat_id, photo, **kwargs)
+
+    async def reply_document(self, document, **kwargs):
+        return await self.bot.send_document(self.chat_id, document, **kwargs)
+
+    async def edit_text(self, text, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+
+class FakeCallbackQuery:
+    def __init__(self, bot: FakeBot, user, data: str):
+        self.bot = bot
+        self.id = str(random.getrandbits(32))
+        self.from_user = user
+        self.data = data
+        self.message = FakeMessage(bot, user.id, text="menu")
+
+    async def answer(self, *args, **kwargs):
+        return await self.bot.answer_callback_query(self.id)
+
+def make_user(user_id: int):
+    return SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="Bench")
+
+def command_update(bot: FakeBot, user_id: int, text: str):
+    user = make_user(user_id)
+    message = FakeMessage(bot, user_id, text=text)
+    return SimpleNamespace(effective_user=user, message=message, callback_query=None, effective_message=message)
+
+def callback_update(bot: FakeBot, user_id: int, data: str):
+    user = make_user(user_id)
+    query = FakeCallbackQuery(bot, user, data)
+    return SimpleNamespace(effective_user=user, message=None, callback_query=query, effective_message=query.message)
+
+def make_context(bot: FakeBot, args=None, user_data=None):
+    return SimpleNamespace(bot=bot, args=args or [], user_data=user_data if user_data is not None else {})
+
+# ------------------- MAʼLUMOTLARNI TAYYORLASH -------------------
+def write_users(n: int):
+    """Joriy papkada n ta foydalanuvchili users.json yaratish"""
+    users = {}
+    for i in range(n):
+        users[str(BASE_USER_ID + i)] = {
+            "balance": random.choice((0, 2500, 15000, 30000)),
+            "referred_by": None,
+            "referrals": random.randint(0, 5),
+            "referral_code": f"{i:07d}",
+            "start_bonus_given": True,
+            "withdraw_code": f"{i + 5000000:07d}",
+            "username": f"user{i}",
+            "first_name": "Bench",
+            "joined_at": str(float(i)),
+        }
+    with open("users.json", "w") as f:
+        json.dump(users, f)
+    games = {
+        f"Kupon {i}": {"id": i + 1, "text": f"<b>Kupon {i}</b>", "photo_id": None, "views": 0}
+        for i in range(COUPONS)
+    }
+    with open("games.json", "w") as f:
+        json.dump(games, f)
+
+# ------------------- O'LCHASH -------------------
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+def report(name: str, latencies, elapsed: float):
+    print(
+        f"  {name:<16} p50={percentile(latencies, 50) * 1000:8.3f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.3f}ms "
+        f"{len(latencies) / elapsed:10.1f} req/s"
+    )
+
+async def measure(name: str, calls):
+    """calls - (handler, update, context) ro'yxati; har biri alohida o'lchanadi"""
+    latencies = []
+    started = time.perf_counter()
+    for handler, update, context in calls:
+        t0 = time.perf_counter()
+        await handler(update, context)
+        latencies.append(time.perf_counter() - t0)
+    report(name, latencies, time.perf_counter() - started)
+
+async def run_scenario(main, n: int, requests: int, broadcast: bool, memory: bool = False):
+    bot = FakeBot()
+    main.storage = None
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    main.storage = main.create_storage()
+    print(f"  {'load':<16} {time.perf_counter() - started:.3f}s")
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {'memory':<16} {current / 2 ** 20:.1f} MB (yuklashda eng ko'pi {peak / 2 ** 20:.1f} MB)")
+    main.games_data = main.storage.load_games()
+    main.invalidate_games()
+    await main.storage.start()
+    await main.admin_stats.load()
+
+    existing = [BASE_USER_ID + random.randrange(n) for _ in range(requests)]
+    new_ids = iter(range(BASE_USER_ID + n, BASE_USER_ID + n + 2 * requests))
+    coupons = [game["id"] for game in main.games_data.values()]
+
+    await measure("start", [
+        (main.start, command_update(bot, next(new_ids), "/start"), make_context(bot))
+        for _ in range(requests)
+    ])
+    await measure("start ref_", [
+        (
+            main.start,
+            command_update(bot, next(new_ids), "/start"),
+            make_context(bot, args=[f"ref_{random.randrange(n):07d}"]),
+        )
+        for _ in range(requests)
+    ])
+    await measure("show_games", [
+        (main.show_games, callback_update(bot, uid, f"games_page_{random.randrange(main.games_page_count())}"), make_context(bot))
+        for uid in existing
+    ])
+    await measure("game_callback", [
+        (main.game_callback, callback_update(bot, uid, f"game_{random.choice(coupons)}"), make_context(bot))
+        for uid in existing
+    ])
+    await measure("earn_callback", [
+        (main.earn_callback, callback_update(bot, uid, "earn"), make_context(bot))
+        for uid in existing
+    ])
+    await measure("balance_callback", [
+        (main.balance_callback, callback_update(bot, uid, "balance"), make_context(bot))
+        for uid in existing
+    ])
+
+    await measure("stats", [
+        (main.stats, command_update(bot, main.ADMIN_ID, "/stats"), make_context(bot))
+        for _ in range(requests)
+    ])
+
+    if broadcast:
+        # Tezlik cheklovi o'chiriladi: faqat botning o'z xarajati o'lchanadi
+        main.send_bucket = main.TokenBucket(1e9)
+        sent_before = bot.calls["sendMessage"]
+        update = command_update(bot, main.ADMIN_ID, "Bench broadcast")
+        started = time.perf_counter()
+        await main.handle_message(update, make_context(bot, user_data={"waiting_for": "broadcast"}))
+        await main.active_broadcast.task
+        elapsed = time.perf_counter() - started
+        sent = bot.calls["sendMessage"] - sent_before
+        print(f"  {'broadcast':<16} {sent} xabar, {elapsed:.2f}s, {sent / elapsed:10.1f} msg/s")
+
+    await main.storage.close()
+    print(f"  Bot API chaqiruvlari: {dict(bot.calls)}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--skip-broadcast", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="storage xotirasini tracemalloc bilan o'lchash")
+    parser.add_argument("--binary", action="store_true", help="users.json ni users.bin ga o'tkazib, undan yuklash")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    workdir = os.getcwd()
+    for n in args.users:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                write_users(n)
+                if args.binary:
+                    import usertable
+                    usertable.convert("users.json", "users.bin")
+                import main  # bot fayllari joriy papkadan yuklanadi
+                logging.getLogger().setLevel(logging.WARNING)
+                print(f"\n=== {n} foydalanuvchi ===")
+                asyncio.run(run_scenario(main, n, args.requests, not args.skip_broadcast, args.memory))
+            finally:
+                os.chdir(workdir)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,60 @@
+"""Router va bir nechta workerni bitta mashinada ishga tushirish (mahalliy sinov uchun).
+
+Har bir worker alohida jarayon: BOT_ROLE=worker, SHARD_INDEX=i va o'z porti.
+Router Telegramdan (yoki fake_bot_api.py dan) updatelarni olib workerlarga
+taqsimlaydi. Workerlar umumiy MongoDB dan foydalanadi.
+
+Ishlatish:
+    python fake_bot_api.py --port 8081 --rate 200 --users 10000
+    BOT_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123:fake MONGO_URL=mongodb://localhost:27017 \\
+        python cluster.py --workers 4
+
+Ctrl+C hamma jarayonlarni to'xtatadi.
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=8100, help="workerlar portlari shundan boshlanadi")
+    parser.add_argument("--metrics-port", type=int, default=0, help="workerlar metrikalari porti boshi (0 - o'chiq)")
+    args = parser.parse_args()
+
+    worker_urls = ",".join(f"http://127.0.0.1:{args.base_port + i}" for i in range(args.workers))
+    env = dict(
+        os.environ,
+        WORKER_URLS=worker_urls,
+        SHARD_SECRET=os.environ.get("SHARD_SECRET") or secrets.token_urlsafe(16),
+        STORAGE_BACKEND=os.environ.get("STORAGE_BACKEND", "mongo"),
+    )
+    script = os.path.join(HERE, "main.py")
+    processes = []
+    for i in range(args.workers):
+        metrics_port = args.metrics_port + i if args.metrics_port else 0
+        worker_env = dict(env, BOT_ROLE="worker", SHARD_INDEX=str(i), METRICS_PORT=str(metrics_port))
+        processes.append(subprocess.Popen([sys.executable, script], env=worker_env))
+    # Workerlar tinglay boshlaguncha kutish
+    time.sleep(2)
+    processes.append(subprocess.Popen([sys.executable, script], env=dict(env, BOT_ROLE="router", METRICS_PORT="0")))
+
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == "__main__":
+    main()
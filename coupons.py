@@ -0,0 +1,118 @@
+"""Kuponlarni JSON/CSV fayl orqali ommaviy import va eksport qilish.
+
+Import fayli - kuponlar ro'yxati (JSON massiv, {nom: kupon} lug'ati yoki
+sarlavhali CSV). Maydonlar: name, text, photo_id, publish_at, expire_at, delete.
+publish_at/expire_at - unix vaqt yoki ISO sana ("2026-10-18T09:00"); delete
+rost bo'lsa kupon o'chiriladi. Fayl to'liq tekshiriladi: bitta xato bo'lsa ham
+hech narsa qo'llanmaydi.
+"""
+import csv
+import io
+import json
+import math
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+SCHEDULE_FIELDS = ("publish_at", "expire_at")
+MAX_NAME_BYTES = 200    # Tugma matni uchun yetarli
+MAX_TEXT_LENGTH = 4096  # Telegram xabari chegarasi
+
+def parse_time(value) -> Optional[float]:
+    """Unix vaqt yoki ISO sanani float timestamp ga o'tkazish (bo'sh qiymat - None)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        timestamp = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            timestamp = float(text)
+        except ValueError:
+            timestamp = datetime.fromisoformat(text).timestamp()
+    # inf/nan va platforma chegarasidan tashqaridagi vaqtlar eksportni va navbatni buzadi
+    if not math.isfinite(timestamp):
+        raise ValueError(f"{value!r} chekli vaqt emas")
+    try:
+        datetime.fromtimestamp(timestamp)
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f"{value!r} ruxsat etilgan vaqt oralig'idan tashqarida") from None
+    return timestamp
+
+def parse_flag(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "ha")
+    return bool(value)
+
+def _rows(data: bytes, filename: str) -> List[Dict]:
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith(".csv"):
+        return list(csv.DictReader(io.StringIO(text)))
+    parsed = json.loads(text)
+    if isinstance(parsed, dict):
+        return [dict(value, name=name) for name, value in parsed.items()]
+    if not isinstance(parsed, list):
+        raise ValueError("JSON ro'yxat yoki lug'at bo'lishi kerak")
+    return parsed
+
+def parse_coupons(data: bytes, filename: str) -> Tuple[Dict[str, Dict], List[str], List[str]]:
+    """Fayldan (qo'shiladigan/yangilanadigan kuponlar, o'chiriladigan nomlar, xatolar)"""
+    try:
+        rows = _rows(data, filename)
+    except (UnicodeDecodeError, ValueError, TypeError, csv.Error) as e:
+        return {}, [], [f"Faylni o'qib bo'lmadi: {e}"]
+    upserts: Dict[str, Dict] = {}
+    deletes: List[str] = []
+    errors: List[str] = []
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append(f"{number}: yozuv obyekt emas")
+            continue
+        name = str(row.get("name") or "").strip()
+        if not name:
+            errors.append(f"{number}: name bo'sh")
+            continue
+        if len(name.encode()) > MAX_NAME_BYTES:
+            errors.append(f"{number}: nom juda uzun")
+            continue
+        if name in upserts or name in deletes:
+            errors.append(f"{number}: '{name}' takrorlangan")
+            continue
+        if parse_flag(row.get("delete")):
+            deletes.append(name)
+            continue
+        text = str(row.get("text") or "")
+        if not text or len(text) > MAX_TEXT_LENGTH:
+            errors.append(f"{number}: '{name}' matni bo'sh yoki {MAX_TEXT_LENGTH} belgidan uzun")
+            continue
+        coupon = {"text": text, "photo_id": row.get("photo_id") or None}
+        try:
+            for field in SCHEDULE_FIELDS:
+                value = parse_time(row.get(field))
+                if value is not None:
+                    coupon[field] = value
+        except ValueError as e:
+            errors.append(f"{number}: '{name}' vaqti noto'g'ri ({e})")
+            continue
+        if coupon.get("publish_at") and coupon.get("expire_at") and coupon["expire_at"] <= coupon["publish_at"]:
+            errors.append(f"{number}: '{name}' expire_at publish_at dan keyin bo'lishi kerak")
+            continue
+        upserts[name] = coupon
+    return upserts, deletes, errors
+
+def export_coupons(games: Dict[str, Dict], views: Callable[[str], int], fmt: str = "json") -> bytes:
+    """Kuponlarni ko'rishlar soni bilan import formatida eksport qilish"""
+    rows = []
+    for name, game in games.items():
+        row = {"name": name, "id": game.get("id"), "text": game.get("text", ""), "photo_id": game.get("photo_id")}
+        for field in SCHEDULE_FIELDS:
+            if game.get(field) is not None:
+                row[field] = datetime.fromtimestamp(game[field]).isoformat(timespec="seconds")
+        row["views"] = views(name)
+        rows.append(row)
+    if fmt == "csv":
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=["name", "id", "text", "photo_id", *SCHEDULE_FIELDS, "views"])
+        writer.writeheader()
+        writer.writerows(rows)
+        return out.getvalue().encode()
+    return json.dumps(rows, ensure_ascii=False, indent=2).encode()
@@ -0,0 +1,315 @@
+"""Yuklama testlari uchun mahalliy soxta Telegram Bot API serveri.
+
+Server getUpdates (long polling) va webhook orqali soxta updatelar beradi,
+sendMessage/sendPhoto/sendDocument/editMessageText/answerCallbackQuery
+so'rovlarini qabul qilib hisoblaydi. Kechikish, 429 (retry_after) va 403
+(botni bloklagan foydalanuvchi) javoblarini sozlash mumkin.
+
+Ishlatish:
+    python fake_bot_api.py --port 8081 --rate 50 --users 1000 --latency 30 --rate-limit 0.01 --blocked 0.05
+    BOT_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123:fake python main.py
+
+Webhook rejimini sinash uchun botni BOT_MODE=webhook va
+WEBHOOK_URL=http://127.0.0.1:8080 WEBHOOK_SECRET=test bilan ishga tushiring: setWebhook dan keyin
+server updatelarni shu manzilga POST qiladi. Statistika: GET /stats
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import zlib
+from collections import Counter, deque
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.web import Application, RequestHandler
+
+logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+logger = logging.getLogger("fake_bot_api")
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+BASE_USER_ID = 10 ** 9
+# Soxta updatelar aralashmasi: (ulush, tur, callback_data)
+UPDATE_MIX = [
+    (0.15, "message", "/start"),
+    (0.25, "callback", "balance"),
+    (0.25, "callback", "earn"),
+    (0.20, "callback", "show_games"),
+    (0.15, "callback", "main_menu"),
+]
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+class FakeTelegram:
+    """Server holati: update navbati, webhook, statistika"""
+
+    def __init__(self, args):
+        self.args = args
+        self.updates = deque()
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.new_updates = asyncio.Event()
+        self.webhook_url = None
+        self.webhook_secret = None
+        self.webhook_slots = asyncio.Semaphore(args.webhook_connections)
+        self.calls = Counter()
+        self.errors = Counter()
+        # Yuborilgan update -> bot javobigacha bo'lgan vaqtni o'lchash
+        self.pending_chats = {}    # chat_id -> update yaratilgan vaqt
+        self.pending_queries = {}  # callback_query_id -> update yaratilgan vaqt
+        self.latencies = deque(maxlen=100000)
+
+    # ---------- Soxta xatolar ----------
+    def is_blocked(self, chat_id) -> bool:
+        """chat_id bo'yicha barqaror: bir foydalanuvchi har doim bloklagan yoki yo'q"""
+        if not self.args.blocked:
+            return False
+        return zlib.crc32(str(chat_id).encode()) % 10000 < self.args.blocked * 10000
+
+    def fault(self, method: str, params: dict):
+        """Xato javobini qaytarish (kerak bo'lsa): (status, body) yoki None"""
+        if self.args.rate_limit and random.random() < self.args.rate_limit:
+            retry_after = self.args.retry_after
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+        if method.startswith("send") and self.is_blocked(params.get("chat_id")):
+            return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        return None
+
+    # ---------- Updatelar ----------
+    def make_update(self) -> dict:
+        roll = random.random()
+        for share, kind, data in UPDATE_MIX:
+            if roll < share:
+                break
+            roll -= share
+        user_id = BASE_USER_ID + random.randrange(self.args.users)
+        user = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        now = int(time.time())
+        update = {"update_id": self.next_update_id}
+        self.next_update_id += 1
+        if kind == "message":
+            update["message"] = {
+                "message_id": self.next_message_id,
+                "date": now,
+                "chat": chat,
+                "from": user,
+                "text": data,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(data)}],
+            }
+            self.pending_chats[user_id] = time.monotonic()
+        else:
+            query_id = str(update["update_id"])
+            update["callback_query"] = {
+                "id": query_id,
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {"message_id": self.next_message_id, "date": now, "chat": chat, "from": BOT_USER, "text": "menu"},
+            }
+            self.pending_queries[query_id] = time.monotonic()
+        self.next_message_id += 1
+        return update
+
+    def observe(self, method: str, params: dict):
+        """Bot javobini kelgan update bilan bog'lab kechikishni yozish"""
+        started = None
+        if method == "answerCallbackQuery":
+            started = self.pending_queries.pop(str(params.get("callback_query_id")), None)
+        elif method.startswith("send"):
+            try:
+                started = self.pending_chats.pop(int(params.get("chat_id")), None)
+            except (TypeError, ValueError):
+                started = None
+        if started is not None:
+            self.latencies.append(time.monotonic() - started)
+
+    async def deliver(self, update: dict):
+        """Webhook o'rnatilgan bo'lsa POST qilish, aks holda getUpdates navbatiga qo'yish"""
+        if not self.webhook_url:
+            self.updates.append(update)
+            self.new_updates.set()
+            return
+        headers = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+        async with self.webhook_slots:
+            try:
+                await AsyncHTTPClient().fetch(HTTPRequest(
+                    self.webhook_url, method="POST", headers=headers, body=json.dumps(update), request_timeout=30,
+                ))
+                self.calls["webhook"] += 1
+            except Exception as e:
+                self.errors["webhook"] += 1
+                logger.warning(f"Webhook yetkazilmadi: {e}")
+
+    async def generate(self):
+        """Sozlangan tezlikda updatelar yaratish"""
+        if not self.args.rate:
+            return
+        interval = 1 / self.args.rate
+        deadline = time.monotonic() + self.args.duration if self.args.duration else None
+        while deadline is None or time.monotonic() < deadline:
+            asyncio.create_task(self.deliver(self.make_update()))
+            await asyncio.sleep(interval)
+        logger.info("Update yaratish tugadi")
+
+    async def get_updates(self, offset: int, timeout: float, limit: int):
+        while self.updates and self.updates[0]["update_id"] < offset:
+            self.updates.popleft()
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [update for _, update in zip(range(limit), self.updates)]
+
+    # ---------- Javoblar ----------
+    def message_result(self, params: dict, **extra) -> dict:
+        self.next_message_id += 1
+        chat_id = params.get("chat_id") or 0
+        return {
+            "message_id": self.next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+
+    async def call(self, method: str, params: dict):
+        """Bot API metodini bajarish: (status, body)"""
+        self.calls[method] += 1
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+        if method == "getUpdates":
+            result = await self.get_updates(
+                int(params.get("offset") or 0), float(params.get("timeout") or 0), int(params.get("limit") or 100)
+            )
+            return 200, {"ok": True, "result": result}
+        if method == "setWebhook":
+            self.webhook_url = params.get("url") or None
+            self.webhook_secret = params.get("secret_token")
+            logger.info(f"Webhook o'rnatildi: {self.webhook_url}")
+            return 200, {"ok": True, "result": True}
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            return 200, {"ok": True, "result": True}
+        if method == "getWebhookInfo":
+            return 200, {"ok": True, "result": {"url": self.webhook_url or "", "pending_update_count": len(self.updates)}}
+
+        if self.args.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.args.latency / 1000)
+        error = self.fault(method, params)
+        if error:
+            self.errors[method] += 1
+            return error
+        self.observe(method, params)
+
+        if method == "sendMessage":
+            return 200, {"ok": True, "result": self.message_result(params, text=str(params.get("text", "")))}
+        if method == "sendPhoto":
+            photo = [{"file_id": "photo", "file_unique_id": "photo", "width": 1, "height": 1}]
+            return 200, {"ok": True, "result": self.message_result(params, photo=photo, caption=params.get("caption"))}
+        if method == "sendDocument":
+            document = {"file_id": "document", "file_unique_id": "document"}
+            return 200, {"ok": True, "result": self.message_result(params, document=document)}
+        if method in ("editMessageText", "editMessageCaption", "editMessageReplyMarkup"):
+            return 200, {"ok": True, "result": self.message_result(params, text=str(params.get("text", "")))}
+        if method in ("answerCallbackQuery", "deleteMessage"):
+            return 200, {"ok": True, "result": True}
+        return 200, {"ok": True, "result": True}
+
+    def stats(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "mode": "webhook" if self.webhook_url else "polling",
+            "queued_updates": len(self.updates),
+            "latency_ms": {
+                "count": len(latencies),
+                "p50": percentile(latencies, 50) * 1000,
+                "p99": percentile(latencies, 99) * 1000,
+            },
+        }
+
+# ------------------- HTTP -------------------
+def parse_params(handler: RequestHandler) -> dict:
+    """JSON, form yoki multipart parametrlarini lug'atga aylantirish"""
+    if handler.request.headers.get("Content-Type", "").startswith("application/json") and handler.request.body:
+        return json.loads(handler.request.body)
+    params = {}
+    arguments = {**handler.request.query_arguments, **handler.request.body_arguments}
+    for key, values in arguments.items():
+        value = values[-1].decode()
+        try:
+            # Bot API parametrlarining murakkablari JSON qatori bo'lib keladi
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+class MethodHandler(RequestHandler):
+    def initialize(self, telegram: FakeTelegram):
+        self.telegram = telegram
+
+    async def post(self, token: str, method: str):
+        status, body = await self.telegram.call(method, parse_params(self))
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+    get = post
+
+class StatsHandler(RequestHandler):
+    def initialize(self, telegram: FakeTelegram):
+        self.telegram = telegram
+
+    def get(self):
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(self.telegram.stats(), indent=2))
+
+async def serve(args):
+    telegram = FakeTelegram(args)
+    app = Application([
+        (r"/bot([^/]+)/(\w+)", MethodHandler, {"telegram": telegram}),
+        (r"/stats", StatsHandler, {"telegram": telegram}),
+    ])
+    app.listen(args.port, address=args.host)
+    logger.info(f"Soxta Bot API: http://{args.host}:{args.port} (statistika: /stats)")
+    asyncio.create_task(telegram.generate())
+    while True:
+        await asyncio.sleep(10)
+        stats = telegram.stats()
+        logger.info(
+            f"{stats['mode']}: {sum(stats['calls'].values())} so'rov, xatolar {stats['errors']}, "
+            f"p50={stats['latency_ms']['p50']:.1f}ms p99={stats['latency_ms']['p99']:.1f}ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=float, default=20, help="soniyasiga yaratiladigan updatelar (0 - o'chiq)")
+    parser.add_argument("--duration", type=float, default=0, help="update yaratish davomiyligi, soniya (0 - cheksiz)")
+    parser.add_argument("--users", type=int, default=1000, help="soxta foydalanuvchilar soni")
+    parser.add_argument("--latency", type=float, default=0, help="o'rtacha javob kechikishi, ms")
+    parser.add_argument("--rate-limit", type=float, default=0, help="429 qaytarish ehtimoli")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 javobidagi retry_after, soniya")
+    parser.add_argument("--blocked", type=float, default=0, help="botni bloklagan foydalanuvchilar ulushi (403)")
+    parser.add_argument("--webhook-connections", type=int, default=40, help="webhookka parallel ulanishlar")
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,130 @@
-import json
 import logging
 import os
 import asyncio
+import functools
+import heapq
+import io
 import random
-from pathlib import Path
-from typing import Dict
+import signal
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 
+import metrics
+from coupons import export_coupons, parse_coupons
+from metrics import Counter, Gauge, Histogram
+from profiler import profiler
+from shard import ShardClient, shard_of, start_worker_server, worker_port
+from storage import JsonStorage, MongoStorage, Storage
+
 # ------------------- SOZLAMALAR -------------------
 TOKEN = os.environ.get("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_ID = 6935090105  # Admin Telegram ID
 
+# Ishga tushirish rejimi: "polling" yoki "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_PORT = int(os.environ.get("PORT", "8080"))  # Railway PORT ni o'zi beradi
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+# Telegram har bir so'rovda X-Telegram-Bot-Api-Secret-Token sarlavhasida yuboradi.
+# Barcha replikalarda bir xil bo'lishi kerak (setWebhook oxirgi qiymatni saqlaydi)
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+# Tashqi manzil, masalan https://mybot.up.railway.app
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL") or (
+    f"https://{os.environ['RAILWAY_PUBLIC_DOMAIN']}" if os.environ.get("RAILWAY_PUBLIC_DOMAIN") else ""
+)
+
+# Bot API manzili: yuklama testlari uchun fake_bot_api.py ga yo'naltirish mumkin
+BOT_API_URL = os.environ.get("BOT_API_URL", "https://api.telegram.org")
+BOT_API_POOL_SIZE = int(os.environ.get("BOT_API_POOL_SIZE", "256"))  # HTTP ulanishlar havzasi
+
+# Prometheus metrikalari porti (0 - o'chiq)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+LOOP_LAG_INTERVAL = 1.0  # Event loop kechikishini o'lchash oralig'i (soniya)
+
+# /profile: namunaviy profiler va sekin callbacklar
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+PROFILE_INTERVAL = 0.005        # Namuna olish oralig'i (soniya)
+PROFILE_SLOW_CALLBACK = 0.05    # Shundan uzoq bajarilgan event loop callbacklari yoziladi
+
+# Ko'p jarayonli rejim: "single" (bitta jarayon), "router" (updatelarni WORKER_URLS
+# dagi workerlarga foydalanuvchi bo'yicha taqsimlaydi) yoki "worker" (SHARD_INDEX)
+BOT_ROLE = os.environ.get("BOT_ROLE", "single")
+WORKER_URLS = [url for url in os.environ.get("WORKER_URLS", "").split(",") if url]
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", "0"))
+SHARD_SECRET = os.environ.get("SHARD_SECRET", "")  # Router va workerlar uchun umumiy
+
+# Bir vaqtda qayta ishlanadigan updatelar soni (bitta foydalanuvchiniki navbat bilan)
+CONCURRENT_UPDATES = int(os.environ.get("CONCURRENT_UPDATES", "256"))
+
+# Flood nazorati: har bir foydalanuvchiga token bucket (adminga qo'llanmaydi)
+FLOOD_RATE = float(os.environ.get("FLOOD_RATE", "1"))     # update/soniya
+FLOOD_BURST = int(os.environ.get("FLOOD_BURST", "5"))     # ketma-ket ruxsat etilgan updatelar
+DUPLICATE_WINDOW = 1.5    # Shu oraliqda (soniya) bir xil callback_data takrorlansa tashlab yuboriladi
+FLOOD_MAX_USERS = 100000  # Xotiradagi holatlar soni shundan oshsa eskilari tozalanadi
+
+# Menyu navigatsiyasi: "edit" - mavjud xabarni tahrirlash, "send" - har safar yangi xabar
+NAV_MODE = os.environ.get("NAV_MODE", "edit")
+
 # Fayl yo'llari
 DATA_FILE = "games.json"
+GAMES_ARCHIVE_FILE = "games_archive.jsonl"  # Muddati o'tgan kuponlar (yuklanmaydi)
 USERS_FILE = "users.json"
+USERS_LOG_FILE = "users.log"  # Foydalanuvchi o'zgarishlari jurnali (append-only)
+USERS_BIN_FILE = "users.bin"  # Binar snapshot (tez yuklanadi)
 APK_FILE = "apk.json"
+STATE_FILE = "state.json"  # Broadcast holati va boshqa kichik yozuvlar
+
+# Jurnal rejimi: har bir o'zgarish users.log ga bitta qator bo'lib qo'shiladi
+USERS_WAL = os.environ.get("USERS_WAL", "1") == "1"
+USERS_COMPACT_EVERY = int(os.environ.get("USERS_COMPACT_EVERY", "5000"))  # Nechta yozuvdan keyin siqish
+# Snapshot formati: "binary" (users.bin, tez ishga tushish) yoki "json" (users.json)
+USERS_SNAPSHOT = os.environ.get("USERS_SNAPSHOT", "binary")
+
+# Saqlash backendi: "json" (fayllar) yoki "mongo"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+MONGO_DB = os.environ.get("MONGO_DB", "betwinner_bot")
+MONGO_POOL_SIZE = int(os.environ.get("MONGO_POOL_SIZE", "50"))
+
+# Saqlash so'rovlari shu vaqt (soniya) ichida bitta yozuvga birlashtiriladi
+PERSIST_DELAY = float(os.environ.get("PERSIST_DELAY", "0.5"))
+
+# Broadcast: Telegram umumiy limiti ~30 xabar/soniya
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", "25"))            # xabar/soniya
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "20"))  # bir vaqtdagi so'rovlar
+BROADCAST_BATCH = 200              # Har shuncha foydalanuvchidan keyin holat saqlanadi
+BROADCAST_RETRIES = 3              # Tarmoq xatosida qayta urinishlar soni
+BROADCAST_PROGRESS_INTERVAL = 5    # Holat xabarini yangilash oralig'i (soniya)
+
+# Kupon ko'rishlari xotirada yig'iladi va games.json ga guruhlab yoziladi
+VIEWS_FLUSH_INTERVAL = int(os.environ.get("VIEWS_FLUSH_INTERVAL", "60"))  # soniya
+VIEWS_FLUSH_EVERY = int(os.environ.get("VIEWS_FLUSH_EVERY", "200"))       # ko'rishlar soni
+
+MAX_IMPORT_BYTES = 1024 * 1024  # Kuponlar import fayli chegarasi
+COUPON_ARCHIVE_RETRY = 60       # Arxivlash xato bersa qayta urinish oralig'i (soniya)
+GAMES_PAGE_SIZE = 8      # Kuponlar menyusidagi bitta sahifadagi tugmalar
+STATS_TOP = 10          # /stats dagi eng faol taklif qiluvchilar soni
 
 REFERRAL_BONUS = 2500  # Har bir taklif uchun bonus
 START_BONUS = 15000     # Start bonusi
+START_BONUS_DELAY = 90  # Start bonusi necha soniyadan keyin beriladi
+START_BONUS_BATCH = 500 # Bir martada to'lanadigan bonuslar soni
+START_BONUS_RETRY = 30  # Storage xato bersa qayta urinish oralig'i (soniya)
 MIN_WITHDRAW = 25000    # Minimal yechish summasi
 BOT_USERNAME = "BETWINNERplay_bot"  # Bot username (@ belgisisiz)
 WITHDRAW_SITE_URL = "https://futbolinsidepulyechish.netlify.app/"
@@ -37,72 +135,245 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ------------------- METRIKALAR -------------------
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Handler bajarilish vaqti (handler)")
+BOT_API_CALLS = Counter("bot_api_calls_total", "Bot API ga so'rovlar (method)")
+BOT_API_ERRORS = Counter("bot_api_errors_total", "Bot API xatolari (method)")
+EVENT_LOOP_LAG = Gauge("bot_event_loop_lag_seconds", "Event loop kechikishi")
+FLOOD_DROPPED = Counter("bot_flood_dropped_total", "Flood nazorati tashlab yuborgan updatelar (reason)")
+
+class InstrumentedRequest(HTTPXRequest):
+    """Bot API so'rovlari va xatolarini hisoblovchi HTTP klient"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        BOT_API_CALLS.inc(method=api_method)
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            BOT_API_ERRORS.inc(method=api_method)
+            raise
+        if code >= 400:
+            BOT_API_ERRORS.inc(method=api_method)
+        return code, payload
+
+async def loop_lag_monitor():
+    """Event loop qanchalik kech uyg'onishini o'lchash"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.set(time.perf_counter() - started - LOOP_LAG_INTERVAL)
+
 # ------------------- MAʼLUMOTLAR SAQLASH -------------------
-def load_games() -> Dict:
-    if Path(DATA_FILE).exists():
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_games(games: Dict):
-    with open(DATA_FILE, "w") as f:
-        json.dump(games, f)
-
-def load_users() -> Dict:
-    if Path(USERS_FILE).exists():
-        with open(USERS_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_users(users: Dict):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f)
-
-def load_apk() -> Dict:
-    if Path(APK_FILE).exists():
-        with open(APK_FILE, "r") as f:
-            return json.load(f)
-    return {"file_id": None}
-
-def save_apk(apk_data: Dict):
-    with open(APK_FILE, "w") as f:
-        json.dump(apk_data, f)
-
-games_data = load_games()
-users_data = load_users()
-apk_data = load_apk()
+def create_storage() -> Storage:
+    """Sozlamaga ko'ra saqlash backendini tanlash"""
+    if STORAGE_BACKEND == "mongo":
+        logger.info("Saqlash: MongoDB")
+        return MongoStorage(MONGO_URL, MONGO_DB, pool_size=MONGO_POOL_SIZE)
+    return JsonStorage(
+        USERS_FILE,
+        USERS_LOG_FILE,
+        DATA_FILE,
+        APK_FILE,
+        state_file=STATE_FILE,
+        wal=USERS_WAL,
+        compact_every=USERS_COMPACT_EVERY,
+        persist_delay=PERSIST_DELAY,
+        users_bin_file=USERS_BIN_FILE,
+        games_archive_file=GAMES_ARCHIVE_FILE,
+        binary_snapshot=USERS_SNAPSHOT == "binary",
+    )
 
-# ------------------- YORDAMCHI FUNKSIYALAR -------------------
-def is_admin(user_id: int) -> bool:
-    return user_id == ADMIN_ID
+storage = create_storage()
+games_data = storage.load_games()
+apk_data = storage.load_apk()
+
+# ------------------- KO'RISHLAR HISOBLAGICHI -------------------
+pending_views: Dict[str, int] = {}  # Hali diskka yozilmagan ko'rishlar
+pending_views_total = 0
+views_lock = asyncio.Lock()  # Bir vaqtda bitta yozuv (ko'rishlar ikki marta yuborilmasligi uchun)
+views_retry_at = 0.0         # Yozish xato bergandan keyin navbatdagi urinish vaqti (monotonic)
 
-def generate_unique_code() -> str:
-    """Har bir foydalanuvchi uchun unikal kod yaratish"""
+async def record_view(game_name: str):
+    """Kupon ko'rishini xotirada hisoblash (diskka yozmasdan)"""
+    global pending_views_total
+    pending_views[game_name] = pending_views.get(game_name, 0) + 1
+    pending_views_total += 1
+    if pending_views_total >= VIEWS_FLUSH_EVERY and not views_lock.locked() and time.monotonic() >= views_retry_at:
+        await flush_views()
+
+async def flush_views() -> bool:
+    """Yig'ilgan ko'rishlarni bitta yozuv bilan saqlash. Ular pending_views dan
+    games_data ga faqat yozuv muvaffaqiyatli bo'lgach o'tadi; xato bo'lsa
+    navbatda qoladi va False qaytariladi."""
+    global pending_views_total, views_retry_at
+    async with views_lock:
+        if not pending_views:
+            return True
+        counts = dict(pending_views)
+        try:
+            await storage.add_views(counts)
+        except Exception as e:
+            logger.error(f"Ko'rishlarni saqlashda xatolik: {e}, {VIEWS_FLUSH_INTERVAL} soniyadan keyin qayta urinish")
+            views_retry_at = time.monotonic() + VIEWS_FLUSH_INTERVAL
+            return False
+        for game_name, count in counts.items():
+            # Shu orada o'chirilgan kuponniki pending_views da allaqachon yo'q
+            left = pending_views.get(game_name, 0) - count
+            if left > 0:
+                pending_views[game_name] = left
+            else:
+                pending_views.pop(game_name, None)
+            game = games_data.get(game_name)
+            if game:
+                game["views"] = game.get("views", 0) + count
+        pending_views_total = sum(pending_views.values())
+        return True
+
+def drop_pending_views(game_name: str):
+    """O'chirilgan yoki qayta yaratilgan kupon uchun yig'ilgan ko'rishlarni bekor qilish"""
+    global pending_views_total
+    pending_views_total -= pending_views.pop(game_name, 0)
+
+def get_views(game_name: str) -> int:
+    """Kuponning joriy ko'rishlar soni (saqlangan + hali yozilmagan)"""
+    game = games_data.get(game_name, {})
+    return game.get("views", 0) + pending_views.get(game_name, 0)
+
+async def views_flusher():
+    """Ko'rishlarni muntazam ravishda diskka yozib turish"""
     while True:
-        code = f"{random.randint(0, 9999999):07d}"
-        existing_codes = []
-        for user_data in users_data.values():
-            if user_data.get("referral_code"):
-                existing_codes.append(user_data["referral_code"])
-        if code not in existing_codes:
-            return code
+        await asyncio.sleep(VIEWS_FLUSH_INTERVAL)
+        await flush_views()
 
-def get_referral_link(user_id: int) -> str:
-    """Foydalanuvchi uchun referral havola"""
-    user_id_str = str(user_id)
-    if user_id_str in users_data and users_data[user_id_str].get("referral_code"):
-        code = users_data[user_id_str]["referral_code"]
-    else:
-        code = generate_unique_code()
-        if user_id_str in users_data:
-            users_data[user_id_str]["referral_code"] = code
-            save_users(users_data)
-    
-    return f"https://t.me/{BOT_USERNAME}?start=ref_{code}"
+# ------------------- STATISTIKA -------------------
+class AdminStats:
+    """/stats uchun hisoblagichlar va top-K taklif qiluvchilar.
+
+    Har bir hodisada (yangi foydalanuvchi, referral, start bonusi) oshiriladi,
+    shuning uchun javob foydalanuvchilar soniga bog'liq emas. Holat storage
+    meta ("stats") da saqlanadi; u yo'q bo'lsa bir marta storage dan tiklanadi.
+    Taklif qilganlar soni faqat o'sadi, shuning uchun top-K ni minimumni
+    almashtirish bilan aniq yuritish mumkin.
+
+    Worker rejimida har bir worker o'z yozuvini ("stats:<shard>") yuritadi,
+    /stats ularni qo'shib chiqaradi; tiklashni faqat 0-worker bajaradi.
+    """
+
+    def __init__(self):
+        self.data = None
+
+    @staticmethod
+    def meta_key(shard: int) -> str:
+        return f"stats:{shard}" if BOT_ROLE == "worker" else "stats"
+
+    async def load(self):
+        data = await storage.get_meta(self.meta_key(SHARD_INDEX))
+        if data is None:
+            if SHARD_INDEX == 0:
+                logger.info("Statistika storage dan tiklanmoqda...")
+                data = await storage.user_totals(STATS_TOP)
+            else:
+                data = {"users": 0, "balance": 0, "referrals": 0, "start_bonuses": 0, "top_referrers": []}
+            await storage.set_meta(self.meta_key(SHARD_INDEX), data)
+        self.data = data
+
+    async def _save(self):
+        data = dict(self.data)
+        data["top_referrers"] = [list(entry) for entry in data["top_referrers"]]
+        await storage.set_meta(self.meta_key(SHARD_INDEX), data)
+
+    async def combined(self) -> Dict:
+        """Barcha workerlar yozuvlarining yig'indisi (bitta jarayonda - o'z yozuvi)"""
+        if BOT_ROLE != "worker":
+            return self.data
+        parts = [self.data]
+        for shard in range(len(WORKER_URLS)):
+            if shard != SHARD_INDEX:
+                parts.append(await storage.get_meta(self.meta_key(shard)))
+        parts = [part for part in parts if part]
+        total = {key: sum(part[key] for part in parts) for key in ("users", "balance", "referrals", "start_bonuses")}
+        # Hisoblar mutlaq va faqat o'sadi: har bir foydalanuvchi uchun eng kattasi joriy qiymat
+        top = {}
+        for part in parts:
+            for user_id_str, referrals in part["top_referrers"]:
+                top[user_id_str] = max(top.get(user_id_str, 0), referrals)
+        total["top_referrers"] = sorted(top.items(), key=lambda entry: -entry[1])[:STATS_TOP]
+        return total
+
+    async def user_joined(self):
+        self.data["users"] += 1
+        await self._save()
+
+    async def referral(self, referrer_id: str, referrals: int):
+        self.data["referrals"] += 1
+        self.data["balance"] += REFERRAL_BONUS
+        top = dict(self.data["top_referrers"])
+        if referrer_id in top or len(top) < STATS_TOP:
+            top[referrer_id] = referrals
+        else:
+            weakest = min(top, key=top.get)
+            if referrals > top[weakest]:
+                del top[weakest]
+                top[referrer_id] = referrals
+        self.data["top_referrers"] = sorted(top.items(), key=lambda entry: -entry[1])
+        await self._save()
+
+    async def start_bonuses_paid(self, count: int):
+        self.data["start_bonuses"] += count
+        self.data["balance"] += count * START_BONUS
+        await self._save()
+
+admin_stats = AdminStats()
+
+# ------------------- TAYYOR JAVOBLAR -------------------
+# Statik matnlar import paytida bir marta formatlanadi
+START_TEXT = (
+    "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
+    "🔥 *Premium bonuslar* va har hafta yangi yutuqlar sizni kutmoqda!\n"
+    "📢 *BetWinner kun kuponlari* va eng so‘nggi aksiyalar haqida tezkor xabarlar!\n"
+    "✅ Kunlik stavkalar, ekspress kuponlar va bonus imkoniyatlaridan birinchi bo‘lib xabardor bo‘ling.\n\n"
+    "💰 Bu yerda nafaqat o‘ynab, balki *pul ishlashingiz* mumkin:\n"
+    "– Do‘stlaringizni taklif qiling va har bir taklif uchun *2500 so‘m* oling.\n"
+    "– Start bonus sifatida *15000 so‘m* hamyoningizga tushadi.\n\n"
+    "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
+)
+MAIN_MENU_TEXT = (
+    "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
+    "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
+)
+EARN_TEXT = (
+    "💰 *BetWinner bilan qanday qilib pul ishlash mumkin?*\n\n"
+    f"1️⃣ Do‘stlaringizni taklif qiling va har bir taklif uchun *{REFERRAL_BONUS} so‘m* oling.\n"
+    f"2️⃣ Start bonus sifatida *{START_BONUS} so‘m* hamyoningizga tushadi.\n"
+    f"3️⃣ Minimal yechish summasi: *{MIN_WITHDRAW} so‘m*.\n\n"
+    "Sizning referral havolangiz:\n"
+)
+SHARE_TEXT = "&text=Bu%20bot%20orqali%20pul%20ishlash%20mumkin!%20Keling%2C%20birga%20boshlaymiz."
+
+render_cache: Dict[str, object] = {}  # Tayyor klaviaturalar (kuponlarga oidlari "games_" bilan boshlanadi)
+
+def cached(key: str, build):
+    """Kalit bo'yicha tayyor obyektni olish yoki bir marta qurish"""
+    value = render_cache.get(key)
+    if value is None:
+        value = render_cache[key] = build()
+    return value
+
+def invalidate_games():
+    """Kupon qo'shilganda yoki o'chirilganda kuponlar klaviaturasini eskirgan deb belgilash"""
+    for key in [key for key in render_cache if key.startswith("games_")]:
+        del render_cache[key]
+    coupon_scheduler.rebuild()
+
+def is_live(game: Dict, now: float) -> bool:
+    """Kupon hozir ko'rsatiladimi (publish_at kelgan va expire_at o'tmagan)"""
+    publish_at, expire_at = game.get("publish_at"), game.get("expire_at")
+    return (publish_at is None or publish_at <= now) and (expire_at is None or now < expire_at)
 
 def get_main_keyboard() -> InlineKeyboardMarkup:
     """Asosiy menyu tugmalari"""
-    keyboard = [
+    return cached("main_keyboard", lambda: InlineKeyboardMarkup([
         [
             InlineKeyboardButton("📊 Kun stavkasi", callback_data="show_games"),
             InlineKeyboardButton("📱 BetWinner APK", callback_data="show_apk")
@@ -111,66 +382,448 @@ def get_main_keyboard() -> InlineKeyboardMarkup:
             InlineKeyboardButton("💰 Pul ishlash", callback_data="earn"),
             InlineKeyboardButton("💵 Balans", callback_data="balance")
         ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    ]))
 
 def get_back_keyboard() -> InlineKeyboardMarkup:
     """Bosh menyuga qaytish tugmasi"""
-    return InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]])
+    return cached("back_keyboard", lambda: InlineKeyboardMarkup(
+        [[InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]]
+    ))
 
-def get_games_keyboard() -> InlineKeyboardMarkup:
-    """Kun stavkalari ro'yxati"""
-    keyboard = []
-    for game in games_data.keys():
-        keyboard.append([InlineKeyboardButton(game, callback_data=f"game_{game}")])
+def get_balance_keyboard() -> InlineKeyboardMarkup:
+    """Pul chiqarish va bosh menyu tugmalari"""
+    return cached("balance_keyboard", lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")],
+        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
+    ]))
+
+def get_withdraw_keyboard() -> InlineKeyboardMarkup:
+    """Pul yechish sayti tugmasi"""
+    return cached("withdraw_keyboard", lambda: InlineKeyboardMarkup([
+        [InlineKeyboardButton("💳 Saytga o‘tish", url=WITHDRAW_SITE_URL)],
+        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
+    ]))
+
+def get_earn_keyboard(referral_link: str) -> InlineKeyboardMarkup:
+    """Ulashish tugmasi foydalanuvchiga xos, qolgan qatorlar umumiy"""
+    share_url = f"https://t.me/share/url?url={referral_link}{SHARE_TEXT}"
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton("📤 Ulashish", url=share_url)]]
+        + list(get_balance_keyboard().inline_keyboard)
+    )
+
+def games_index() -> Dict:
+    """Kuponlar indeksi: tartiblangan id lar va id -> nom (kuponlar o'zgarganda qayta quriladi)"""
+    def build():
+        # Ko'rinish faqat publish_at/expire_at da o'zgaradi: CouponScheduler o'sha paytda keshni tozalaydi
+        now = time.time()
+        by_id = {game["id"]: name for name, game in games_data.items() if "id" in game and is_live(game, now)}
+        return {"order": list(by_id), "by_id": by_id}
+    return cached("games_index", build)
+
+def find_game(key: str) -> Optional[str]:
+    """callback_data dagi id (yoki eski tugmalardagi nom) bo'yicha kupon nomi"""
+    if key.isdigit():
+        name = games_index()["by_id"].get(int(key))
+        if name is not None:
+            return name
+    return key if key in games_data and is_live(games_data[key], time.time()) else None
+
+def games_page_count() -> int:
+    return max(1, -(-len(games_index()["order"]) // GAMES_PAGE_SIZE))
+
+def build_games_keyboard(page: int) -> InlineKeyboardMarkup:
+    index = games_index()
+    page_ids = index["order"][page * GAMES_PAGE_SIZE:(page + 1) * GAMES_PAGE_SIZE]
+    keyboard = [
+        [InlineKeyboardButton(index["by_id"][game_id], callback_data=f"game_{game_id}")]
+        for game_id in page_ids
+    ]
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Oldingi", callback_data=f"games_page_{page - 1}"))
+    if page + 1 < games_page_count():
+        navigation.append(InlineKeyboardButton("Keyingi ➡️", callback_data=f"games_page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
     keyboard.append([InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")])
     return InlineKeyboardMarkup(keyboard)
 
+def get_games_keyboard(page: int = 0) -> InlineKeyboardMarkup:
+    """Kun stavkalari sahifasi (faqat kuponlar o'zgarganda qayta quriladi)"""
+    return cached(f"games_keyboard:{page}", lambda: build_games_keyboard(page))
+
+# ------------------- YORDAMCHI FUNKSIYALAR -------------------
+async def allocate_game_ids(count: int = 1) -> int:
+    """Yangi kuponlar uchun ketma-ket id lar ajratib, birinchisini qaytarish.
+    Hisoblagich faqat o'sadi: o'chirilgan/arxivlangan kuponlarning id lari
+    qayta berilmaydi, shuning uchun eski game_<id> tugmasi boshqa kuponni ochmaydi."""
+    newest = max((game.get("id", 0) for game in games_data.values()), default=0)
+    first = max(await storage.get_meta("next_game_id") or 1, newest + 1)
+    await storage.set_meta("next_game_id", first + count)
+    return first
+
+async def add_game(name: str, text: str, photo_id: Optional[str]):
+    """Kuponni qo'shish yoki almashtirish (almashtirilganda id saqlanadi)"""
+    old = games_data.get(name)
+    game_id = old["id"] if old and "id" in old else await allocate_game_ids()
+    drop_pending_views(name)
+    games_data[name] = {
+        'id': game_id,
+        'text': text,
+        'photo_id': photo_id,
+        'views': 0
+    }
+    invalidate_games()
+    await storage.save_game(name, games_data[name])
+    await config_changed()
+
+async def apply_coupon_batch(upserts: Dict[str, Dict], deletes: List[str], replace: bool = False) -> Tuple[int, int, int]:
+    """Kuponlar to'plamini bir martada o'zgartirish: bitta storage yozuvi va bitta kesh yangilanishi.
+    Yangilangan kuponlar id va ko'rishlarini saqlaydi. (qo'shildi, yangilandi, o'chirildi) qaytaradi."""
+    if shard_client:
+        # Boshqa workerlar yozgan ko'rishlarni ustidan yozib yubormaslik uchun
+        await reload_config()
+    if replace:
+        deletes = list(deletes) + [name for name in games_data if name not in upserts]
+    deletes = [name for name in dict.fromkeys(deletes) if name in games_data and name not in upserts]
+    stored = {}
+    for name, coupon in upserts.items():
+        old = games_data.get(name) or {}
+        stored[name] = {"id": old.get("id"), **coupon, "views": old.get("views", 0)}
+    new = [game for game in stored.values() if game["id"] is None]
+    if new:
+        next_id = await allocate_game_ids(len(new))
+        for offset, game in enumerate(new):
+            game["id"] = next_id + offset
+    await storage.apply_games(stored, deletes)
+    for name in deletes:
+        del games_data[name]
+        drop_pending_views(name)
+    added = sum(1 for name in stored if name not in games_data)
+    games_data.update(stored)
+    invalidate_games()
+    await config_changed()
+    return added, len(stored) - added, len(deletes)
+
+async def assign_game_ids():
+    """id si yo'q (eski) kuponlarga id berish va saqlash"""
+    missing = [name for name, game in games_data.items() if "id" not in game]
+    if missing:
+        next_id = await allocate_game_ids(len(missing))
+    for offset, name in enumerate(missing):
+        games_data[name]["id"] = next_id + offset
+        await storage.save_game(name, games_data[name])
+    invalidate_games()
+    if missing:
+        await config_changed()
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id == ADMIN_ID
+
+def owns(user_id) -> bool:
+    """Foydalanuvchi shu jarayonga tegishlimi (worker rejimidan tashqari doim True)"""
+    return BOT_ROLE != "worker" or shard_of(int(user_id), len(WORKER_URLS)) == SHARD_INDEX
+
+shard_client = None  # Worker rejimida boshqa workerlar bilan aloqa
+
+async def config_changed():
+    """Kuponlar yoki APK o'zgarganini boshqa workerlarga bildirish"""
+    if shard_client:
+        await shard_client.reload_peers(SHARD_INDEX)
+
+async def reload_config(data: Dict = None):
+    """Kuponlar va APK ni storage dan qayta o'qish (boshqa worker o'zgartirganda)"""
+    await flush_views()
+    games = await asyncio.to_thread(storage.load_games)
+    apk = await asyncio.to_thread(storage.load_apk)
+    for name in list(pending_views):
+        if name not in games:
+            drop_pending_views(name)
+    games_data.clear()
+    games_data.update(games)
+    invalidate_games()
+    apk_data.clear()
+    apk_data.update(apk)
+    logger.info("Kuponlar va APK qayta yuklandi")
+
+# user_id -> Lock. Ishlatilmay qolgan locklar avtomatik o'chadi
+user_locks = weakref.WeakValueDictionary()
+
+def user_lock(user_id) -> asyncio.Lock:
+    """Foydalanuvchi uchun lock (bir foydalanuvchining updatelari ketma-ket bajariladi)"""
+    key = str(user_id)
+    lock = user_locks.get(key)
+    if lock is None:
+        lock = user_locks[key] = asyncio.Lock()
+    return lock
+
+def timed(handler, branch_key: str = None):
+    """Handler vaqtini bot_handler_seconds ga yozish.
+    branch_key berilsa, context.user_data dagi qiymati label ga qo'shiladi."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        label = name
+        if branch_key:
+            label = f"{name}:{context.user_data.get(branch_key) or '-'}"
+        with HANDLER_SECONDS.time(handler=label):
+            if not profiler.active:
+                return await handler(update, context)
+            started = time.perf_counter()
+            try:
+                return await handler(update, context)
+            finally:
+                user = update.effective_user
+                profiler.record_handler(label, time.perf_counter() - started, f"(user {user.id if user else '-'})")
+    return wrapper
+
+class FloodGuard:
+    """Foydalanuvchi bo'yicha token bucket va bir xil callbacklarni qisqa oynada tashlash"""
+
+    def __init__(self, rate: float, burst: int, duplicate_window: float, max_users: int):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.max_users = max_users
+        # user_id -> [tokens, updated, last_data, last_data_at]; oxirgi update vaqti bo'yicha tartiblangan
+        self.users = OrderedDict()
+
+    def check(self, user_id: int, data: str = None) -> Optional[str]:
+        """Update o'tkazilsa None, aks holda sabab: "duplicate" yoki "rate" """
+        now = time.monotonic()
+        state = self.users.get(user_id)
+        if state is None:
+            while len(self.users) >= self.max_users:
+                # Eng uzoq vaqt update yubormagan foydalanuvchi holatini unutish (O(1))
+                self.users.popitem(last=False)
+            state = self.users[user_id] = [float(self.burst), now, None, 0.0]
+        else:
+            self.users.move_to_end(user_id)
+        state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if data is not None and data == state[2] and now - state[3] < self.duplicate_window:
+            return "duplicate"
+        if state[0] < 1:
+            return "rate"
+        state[0] -= 1
+        if data is not None:
+            state[2], state[3] = data, now
+        return None
+
+flood_guard = FloodGuard(FLOOD_RATE, FLOOD_BURST, DUPLICATE_WINDOW, FLOOD_MAX_USERS)
+
+def flood_control(handler):
+    """Ortiqcha yoki takroriy updatelarni handlerga yetkazmaslik (callbacklarga faqat answer)"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user or is_admin(user.id):
+            return await handler(update, context)
+        query = update.callback_query
+        reason = flood_guard.check(user.id, query.data if query else None)
+        if reason is None:
+            return await handler(update, context)
+        FLOOD_DROPPED.inc(reason=reason)
+        if query:
+            try:
+                await query.answer()
+            except TelegramError:
+                pass
+    return wrapper
+
+def per_user(handler):
+    """Handlerni foydalanuvchi lock i ostida bajarish"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not update.effective_user:
+            return await handler(update, context)
+        async with user_lock(update.effective_user.id):
+            return await handler(update, context)
+    return wrapper
+
+async def show_screen(query, text: str, **kwargs):
+    """Callback javobini ko'rsatish: matnli xabar joyida tahrirlanadi, rasm/hujjat
+    yoki tahrirlab bo'lmaydigan (eski) xabar bo'lsa yangi xabar yuboriladi"""
+    message = query.message
+    if NAV_MODE == "edit" and message.text and not (message.photo or message.document):
+        try:
+            return await message.edit_text(text, **kwargs)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return message
+            # Eski yoki o'chirilgan xabar: yangisini yuborish
+    return await message.reply_text(text, **kwargs)
+
+async def generate_unique_code() -> str:
+    """Har bir foydalanuvchi uchun unikal kod yaratish (kod darhol band qilinadi)"""
+    while True:
+        code = f"{random.randint(0, 9999999):07d}"
+        if await storage.reserve_code(code):
+            return code
+
+async def get_referral_link(user_id: int) -> str:
+    """Foydalanuvchi uchun referral havola"""
+    user_id_str = str(user_id)
+    user_data = await storage.get_user(user_id_str)
+    if user_data and user_data.get("referral_code"):
+        code = user_data["referral_code"]
+    else:
+        code = await generate_unique_code()
+        if user_data:
+            await storage.update_user(user_id_str, {"referral_code": code})
+    
+    return f"https://t.me/{BOT_USERNAME}?start=ref_{code}"
+
 async def ensure_user(user_id: int, username: str = None, first_name: str = None) -> dict:
     """Yangi foydalanuvchi yaratish yoki mavjudini olish"""
     user_id_str = str(user_id)
+    user_data = await storage.get_user(user_id_str)
     
-    if user_id_str not in users_data:
+    if user_data is None:
         # Yangi foydalanuvchi
-        new_code = generate_unique_code()
-        users_data[user_id_str] = {
+        new_code = await generate_unique_code()
+        user_data = await storage.create_user(user_id_str, {
             "balance": 0,
             "referred_by": None,
             "referrals": 0,
             "referral_code": new_code,
             "start_bonus_given": False,
-            "withdraw_code": generate_unique_code(),
+            "withdraw_code": await generate_unique_code(),
             "username": username,
             "first_name": first_name,
             "joined_at": str(asyncio.get_event_loop().time())
-        }
-        save_users(users_data)
+        })
+        await admin_stats.user_joined()
         logger.info(f"✅ Yangi foydalanuvchi: {user_id} (kodi: {new_code})")
     else:
         # Agar referral kodi bo'lmasa, qo'shish
-        if "referral_code" not in users_data[user_id_str]:
-            users_data[user_id_str]["referral_code"] = generate_unique_code()
-            save_users(users_data)
+        if "referral_code" not in user_data:
+            user_data = await storage.update_user(user_id_str, {"referral_code": await generate_unique_code()})
     
-    return users_data[user_id_str]
+    return user_data
+
+# ------------------- START BONUSI -------------------
+class BonusScheduler:
+    """Start bonuslari uchun yagona taymer navbati (muddat bo'yicha heap).
+
+    Har bir foydalanuvchi uchun alohida uxlayotgan vazifa o'rniga bitta fon
+    vazifasi muddati kelgan bonuslarni guruhlab to'laydi. Muddat foydalanuvchi
+    yozuvida (bonus_due_at) saqlanadi, shuning uchun navbat qayta ishga
+    tushganda storage dan tiklanadi.
+    """
+
+    def __init__(self):
+        self.heap = []                     # (due, user_id)
+        self.pending: Dict[str, float] = {}  # user_id -> due (takrorlarni oldini olish)
+        self.wakeup = None
+        self.task = None
+        self.bot = None
+        self.notifications = set()  # Xabar yuborayotgan vazifalar (havola saqlanadi)
+
+    def schedule(self, user_id_str: str, due: float):
+        if user_id_str in self.pending:
+            return
+        self.pending[user_id_str] = due
+        heapq.heappush(self.heap, (due, user_id_str))
+        if self.wakeup and self.heap[0][1] == user_id_str:
+            self.wakeup.set()
+
+    async def load(self):
+        """Berilmagan bonuslarni storage dan tiklash"""
+        for due, user_id_str in await storage.pending_bonuses():
+            if owns(user_id_str):
+                self.schedule(user_id_str, due)
+        if self.pending:
+            logger.info(f"Start bonusi navbati tiklandi: {len(self.pending)} ta")
+
+    def start(self, bot):
+        self.bot = bot
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def _pop_due(self):
+        """Muddati kelgan foydalanuvchilarni navbatdan olish"""
+        now = time.time()
+        batch = []
+        while self.heap and self.heap[0][0] <= now and len(batch) < START_BONUS_BATCH:
+            due, user_id_str = heapq.heappop(self.heap)
+            if self.pending.get(user_id_str) == due:
+                del self.pending[user_id_str]
+                batch.append(user_id_str)
+        return batch
 
-async def give_start_bonus(user_id: int, context: ContextTypes.DEFAULT_TYPE):
-    """1.5 daqiqadan keyin start bonusini berish"""
-    await asyncio.sleep(90)
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            batch = self._pop_due()
+            if batch:
+                try:
+                    await self._pay(batch)
+                except Exception as e:
+                    logger.error(f"Start bonuslarini to'lashda xatolik: {e}")
+                continue
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _pay(self, batch):
+        paid = []
+        for index, user_id_str in enumerate(batch):
+            try:
+                granted = await storage.grant_start_bonus(user_id_str, START_BONUS)
+            except Exception as e:
+                # To'lanmagan foydalanuvchilar keyinroq qayta navbatga qo'yiladi
+                logger.error(f"Start bonusini berishda xatolik: {e}, {START_BONUS_RETRY} soniyadan keyin qayta urinish")
+                retry_at = time.time() + START_BONUS_RETRY
+                for rest in batch[index:]:
+                    self.schedule(rest, retry_at)
+                break
+            if granted:
+                paid.append(user_id_str)
+        if not paid:
+            return
+        # Xabarlar umumiy tezlik cheklovchi orqali fonda yuboriladi, navbat kutib qolmaydi
+        task = asyncio.create_task(self._notify_all(paid))
+        self.notifications.add(task)
+        task.add_done_callback(self.notifications.discard)
+        await admin_stats.start_bonuses_paid(len(paid))
+
+    async def _notify_all(self, paid: List[str]):
+        for user_id_str in paid:
+            await self._notify(user_id_str)
+
+    async def _notify(self, user_id_str: str):
+        for _ in range(BROADCAST_RETRIES + 1):
+            await send_bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    chat_id=int(user_id_str),
+                    text=f"🎉 Tabriklaymiz! Sizga start bonusi sifatida {START_BONUS} so‘m berildi!"
+                )
+                return
+            except RetryAfter as e:
+                send_bucket.pause(e.retry_after)
+            except TelegramError:
+                return
+
+bonus_scheduler = BonusScheduler()
+PENDING_BONUSES = Gauge(
+    "bot_pending_start_bonuses", "Navbatdagi start bonuslari", fn=lambda: len(bonus_scheduler.pending)
+)
+
+async def schedule_start_bonus(user_id: int, user_data: dict):
+    """Start bonusini rejalashtirish (qayta /start bosilganda takrorlanmaydi)"""
     user_id_str = str(user_id)
-    
-    if user_id_str in users_data and not users_data[user_id_str].get("start_bonus_given", False):
-        users_data[user_id_str]["balance"] += START_BONUS
-        users_data[user_id_str]["start_bonus_given"] = True
-        save_users(users_data)
-        
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🎉 Tabriklaymiz! Sizga start bonusi sifatida {START_BONUS} so‘m berildi!"
-            )
-        except:
-            pass
+    due = user_data.get("bonus_due_at")
+    if due is None:
+        due = time.time() + START_BONUS_DELAY
+        await storage.update_user(user_id_str, {"bonus_due_at": due})
+    bonus_scheduler.schedule(user_id_str, due)
 
 # ------------------- START HANDLER -------------------
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -181,6 +834,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Foydalanuvchini yaratish
     user_data = await ensure_user(user_id, user.username, user.first_name)
+    if user_data.get("blocked"):
+        # Botni qayta ishga tushirdi: broadcastlar yana yuboriladi
+        user_data = await storage.update_user(str(user_id), {"blocked": False})
 
     # Referralni tekshirish (format: ref_ABC1234)
     if args and args[0].startswith("ref_"):
@@ -188,25 +844,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         logger.info(f"Referral kod: {referral_code} (user: {user_id})")
         
-        # Referral kod orqali taklif qiluvchini topish
-        referrer_id = None
-        for uid, data in users_data.items():
-            if data.get("referral_code") == referral_code and uid != str(user_id):
-                referrer_id = uid
-                break
+        # Referral kod orqali taklif qiluvchini topish (indeks orqali)
+        referrer_id = await storage.find_user_by_referral_code(referral_code)
+        if referrer_id == str(user_id):
+            referrer_id = None
         
-        # Agar taklif qiluvchi topilsa va bu foydalanuvchi hali taklif qilinmagan bo'lsa
-        if referrer_id and not user_data.get("referred_by"):
+        # Agar taklif qiluvchi topilsa va bu foydalanuvchi hali taklif qilinmagan bo'lsa.
+        # claim_referral atomar: parallel /start lar bonusni ikki marta bermaydi
+        if (
+            referrer_id
+            and not user_data.get("referred_by")
+            and await storage.claim_referral(str(user_id), referrer_id)
+        ):
             logger.info(f"Referral topildi: {referrer_id} -> {user_id}")
             
-            # Referralni belgilash
-            user_data["referred_by"] = referrer_id
-            save_users(users_data)
-            
-            # Taklif qiluvchiga bonus berish
-            users_data[referrer_id]["balance"] += REFERRAL_BONUS
-            users_data[referrer_id]["referrals"] += 1
-            save_users(users_data)
+            # Taklif qiluvchiga bonus berish (atomar $inc, taklif qiluvchi lock i shart emas)
+            referrer_data = await storage.inc_user(referrer_id, {"balance": REFERRAL_BONUS, "referrals": 1})
+            await admin_stats.referral(referrer_id, referrer_data["referrals"])
             
             # Taklif qiluvchiga xabar
             try:
@@ -218,8 +872,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         f"🎉 *Yangi do‘st qo‘shildi!*\n\n"
                         f"👤 {referrer_name}\n"
                         f"💰 Balansingizga {REFERRAL_BONUS} so‘m qo‘shildi.\n"
-                        f"💵 Hozirgi balans: {users_data[referrer_id]['balance']} so‘m\n"
-                        f"👥 Jami do‘stlaringiz: {users_data[referrer_id]['referrals']}"
+                        f"💵 Hozirgi balans: {referrer_data['balance']} so‘m\n"
+                        f"👥 Jami do‘stlaringiz: {referrer_data['referrals']}"
                     ),
                     parse_mode="Markdown"
                 )
@@ -228,21 +882,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Start bonusini rejalashtirish
     if not user_data.get("start_bonus_given", False):
-        asyncio.create_task(give_start_bonus(user_id, context))
+        await schedule_start_bonus(user_id, user_data)
 
     # Start xabari
-    text = (
-        "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
-        "🔥 *Premium bonuslar* va har hafta yangi yutuqlar sizni kutmoqda!\n"
-        "📢 *BetWinner kun kuponlari* va eng so‘nggi aksiyalar haqida tezkor xabarlar!\n"
-        "✅ Kunlik stavkalar, ekspress kuponlar va bonus imkoniyatlaridan birinchi bo‘lib xabardor bo‘ling.\n\n"
-        "💰 Bu yerda nafaqat o‘ynab, balki *pul ishlashingiz* mumkin:\n"
-        "– Do‘stlaringizni taklif qiling va har bir taklif uchun *2500 so‘m* oling.\n"
-        "– Start bonus sifatida *15000 so‘m* hamyoningizga tushadi.\n\n"
-        "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
-    )
     await update.message.reply_text(
-        text,
+        START_TEXT,
         parse_mode="Markdown",
         reply_markup=get_main_keyboard()
     )
@@ -251,12 +895,9 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bosh menyuga qaytish"""
     query = update.callback_query
     await query.answer()
-    text = (
-        "🎰 *BetWinner Bukmekeriga xush kelibsiz!* 🎰\n\n"
-        "👇 Quyidagi tugmalar orqali imkoniyatlarni kashf eting:"
-    )
-    await query.message.reply_text(
-        text,
+    await show_screen(
+        query,
+        MAIN_MENU_TEXT,
         parse_mode="Markdown",
         reply_markup=get_main_keyboard()
     )
@@ -265,29 +906,108 @@ async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_games(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    if not games_data:
-        await query.message.reply_text(
+    page = 0
+    if query.data.startswith("games_page_"):
+        page = min(int(query.data[len("games_page_"):]), games_page_count() - 1)
+    if not games_index()["order"]:
+        await show_screen(
+            query,
             "Hozircha kunlik stavkalar mavjud emas. Tez orada yangilanadi!",
             reply_markup=get_back_keyboard()
         )
         return
-    await query.message.reply_text(
+    await show_screen(
+        query,
         "📊 *Bugungi kun stavkalari:*",
         parse_mode="Markdown",
-        reply_markup=get_games_keyboard()
+        reply_markup=get_games_keyboard(page)
     )
 
+class CouponScheduler:
+    """Kuponlarni publish_at da ko'rsatish va expire_at da arxivlash uchun yagona vaqt navbati.
+
+    Navbat (muddat bo'yicha heap) kuponlar o'zgarganda games_data dan qayta
+    quriladi. Har bir chegara vaqtida menyu keshi yangilanadi; muddati o'tgan
+    kuponlarni ko'rishlari bilan arxivga ko'chirish admin foydalanuvchisining
+    jarayonida bajariladi, shuning uchun jonli to'plam cheklangan bo'lib qoladi.
+    """
+
+    def __init__(self):
+        self.heap = []  # (vaqt, kupon nomi) - faqat kelajakdagi chegaralar
+        self.wakeup = None
+        self.task = None
+
+    def rebuild(self):
+        now = time.time()
+        self.heap = [
+            (game[field], name)
+            for name, game in games_data.items()
+            for field in ("publish_at", "expire_at")
+            if game.get(field) is not None and game[field] > now
+        ]
+        heapq.heapify(self.heap)
+        if self.wakeup:
+            self.wakeup.set()
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.rebuild()
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            now = time.time()
+            if self.heap and self.heap[0][0] <= now:
+                while self.heap and self.heap[0][0] <= now:
+                    heapq.heappop(self.heap)
+                invalidate_games()
+            timeout = self.heap[0][0] - now if self.heap else None
+            if owns(ADMIN_ID):
+                expired = [
+                    name for name, game in games_data.items()
+                    if game.get("expire_at") is not None and game["expire_at"] <= now
+                ]
+                if expired:
+                    try:
+                        await archive_coupons(expired)
+                        continue
+                    except Exception as e:
+                        logger.error(f"Kuponlarni arxivlashda xatolik: {e}")
+                        timeout = min(timeout or COUPON_ARCHIVE_RETRY, COUPON_ARCHIVE_RETRY)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+coupon_scheduler = CouponScheduler()
+
+async def archive_coupons(names: List[str]):
+    """Muddati o'tgan kuponlarni ko'rishlari bilan arxivga ko'chirib, jonli to'plamdan olib tashlash"""
+    archived_at = time.time()
+    records = [
+        {"name": name, **games_data[name], "views": get_views(name), "archived_at": archived_at}
+        for name in names
+    ]
+    await storage.archive_games(records)
+    await storage.apply_games({}, names)
+    for name in names:
+        del games_data[name]
+        drop_pending_views(name)
+    invalidate_games()
+    await config_changed()
+    logger.info(f"{len(names)} ta kupon arxivlandi")
+
 async def game_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    game_name = query.data.replace("game_", "")
+    game_name = find_game(query.data[len("game_"):])
     game = games_data.get(game_name)
     if not game:
-        await query.message.reply_text("Bu kun stavkasi topilmadi.", reply_markup=get_back_keyboard())
+        await show_screen(query, "Bu kun stavkasi topilmadi.", reply_markup=get_back_keyboard())
         return
 
-    game["views"] = game.get("views", 0) + 1
-    save_games(games_data)
+    await record_view(game_name)
 
     text = game.get("text", "Maʼlumot hozircha kiritilmagan.")
     photo_id = game.get("photo_id")
@@ -300,7 +1020,8 @@ async def game_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_back_keyboard()
         )
     else:
-        await query.message.reply_text(
+        await show_screen(
+            query,
             text,
             parse_mode="HTML",
             reply_markup=get_back_keyboard()
@@ -321,7 +1042,8 @@ async def show_apk(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_back_keyboard()
         )
     else:
-        await query.message.reply_text(
+        await show_screen(
+            query,
             "❌ Hozircha APK fayli mavjud emas. Tez orada yuklanadi!",
             reply_markup=get_back_keyboard()
         )
@@ -332,26 +1054,13 @@ async def earn_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    referral_link = get_referral_link(user_id)
-    share_url = f"https://t.me/share/url?url={referral_link}&text=Bu%20bot%20orqali%20pul%20ishlash%20mumkin!%20Keling%2C%20birga%20boshlaymiz."
-    
-    text = (
-        "💰 *BetWinner bilan qanday qilib pul ishlash mumkin?*\n\n"
-        f"1️⃣ Do‘stlaringizni taklif qiling va har bir taklif uchun *{REFERRAL_BONUS} so‘m* oling.\n"
-        f"2️⃣ Start bonus sifatida *{START_BONUS} so‘m* hamyoningizga tushadi.\n"
-        f"3️⃣ Minimal yechish summasi: *{MIN_WITHDRAW} so‘m*.\n\n"
-        f"Sizning referral havolangiz:\n`{referral_link}`"
-    )
+    referral_link = await get_referral_link(user_id)
     
-    keyboard = [
-        [InlineKeyboardButton("📤 Ulashish", url=share_url)],
-        [InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
-    ]
-    await query.message.reply_text(
-        text,
+    await show_screen(
+        query,
+        f"{EARN_TEXT}`{referral_link}`",
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=get_earn_keyboard(referral_link)
     )
 
 async def balance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -365,14 +1074,11 @@ async def balance_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Taklif qilgan do‘stlaringiz: *{user_data['referrals']}*\n\n"
         f"Minimal yechish summasi: {MIN_WITHDRAW} so‘m."
     )
-    keyboard = [
-        [InlineKeyboardButton("💸 Pul chiqarish", callback_data="withdraw")],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
-    ]
-    await query.message.reply_text(
+    await show_screen(
+        query,
         text,
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=get_balance_keyboard()
     )
 
 async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -381,7 +1087,8 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_data = await ensure_user(query.from_user.id)
     
     if user_data['balance'] < MIN_WITHDRAW:
-        await query.message.reply_text(
+        await show_screen(
+            query,
             f"❌ Pul chiqarish uchun minimal balans {MIN_WITHDRAW} so‘m. Sizda {user_data['balance']} so‘m bor.",
             reply_markup=get_back_keyboard()
         )
@@ -392,14 +1099,11 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Sizning maxsus 7 xonali kodingiz: `{user_data['withdraw_code']}`\n"
         f"Pul yechish uchun quyidagi tugma orqali saytga o‘ting va kodni kiriting."
     )
-    keyboard = [
-        [InlineKeyboardButton("💳 Saytga o‘tish", url=WITHDRAW_SITE_URL)],
-        [InlineKeyboardButton("◀️ Bosh menyu", callback_data="main_menu")]
-    ]
-    await query.message.reply_text(
+    await show_screen(
+        query,
         text,
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=get_withdraw_keyboard()
     )
 
 # ------------------- ADMIN BUYRUQLARI -------------------
@@ -419,7 +1123,8 @@ async def deleteapk(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     apk_data['file_id'] = None
-    save_apk(apk_data)
+    await storage.save_apk(apk_data)
+    await config_changed()
     await update.message.reply_text("✅ APK o'chirildi!")
 
 # /newkupon - Yangi kupon qo'shish
@@ -449,12 +1154,115 @@ async def deletekupon(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(text)
     context.user_data['waiting_for'] = 'delete_kupon'
 
+# /importkupon [replace] - Kuponlarni JSON/CSV fayldan ommaviy yuklash
+async def importkupon(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    replace = bool(context.args) and context.args[0].lower() == "replace"
+    await update.message.reply_text(
+        "📥 Kuponlar faylini yuboring (.json yoki .csv).\n"
+        "Ustunlar: name, text, photo_id, publish_at, expire_at, delete."
+        + ("\n⚠️ replace: faylda yo'q kuponlar o'chiriladi." if replace else "")
+    )
+    context.user_data['waiting_for'] = 'kupon_import'
+    context.user_data['import_replace'] = replace
+
+# /exportkupon [csv] - Kuponlarni ko'rishlari bilan fayl qilib olish
+async def exportkupon(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    fmt = "csv" if context.args and context.args[0].lower() == "csv" else "json"
+    await update.message.reply_document(
+        document=io.BytesIO(export_coupons(games_data, get_views, fmt)),
+        filename=f"kuponlar.{fmt}",
+        caption=f"📤 {len(games_data)} ta kupon"
+    )
+
+# /views - Kuponlar ko'rishlari (diskka yozmasdan)
+async def views(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    if not games_data:
+        await update.message.reply_text("Hech qanday kupon mavjud emas.")
+        return
+    
+    text = "👁 Kuponlar ko'rishlari:\n\n"
+    for game in games_data.keys():
+        text += f"• {game}: {get_views(game)}\n"
+    
+    await update.message.reply_text(text)
+
+# /stats - Umumiy statistika (hisoblagichlardan, to'liq o'tishsiz)
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    data = await admin_stats.combined()
+    text = (
+        "📈 Statistika:\n\n"
+        f"👥 Foydalanuvchilar: {data['users']}\n"
+        f"🎁 Start bonuslari: {data['start_bonuses']} ta ({data['start_bonuses'] * START_BONUS} so‘m)\n"
+        f"🤝 Takliflar: {data['referrals']} ta ({data['referrals'] * REFERRAL_BONUS} so‘m)\n"
+        f"💵 Jami balans: {data['balance']} so‘m\n"
+    )
+    if data["top_referrers"]:
+        text += "\n🏆 Eng ko'p taklif qilganlar:\n"
+        for place, (user_id_str, referrals) in enumerate(data["top_referrers"], 1):
+            text += f"{place}. {user_id_str}: {referrals}\n"
+    if games_data:
+        text += "\n👁 Kuponlar ko'rishlari:\n"
+        for game in games_data.keys():
+            text += f"• {game}: {get_views(game)}\n"
+    
+    await update.message.reply_text(text)
+
+# /profile [soniya] - Profillash va hisobotni fayl sifatida olish
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    if profiler.active:
+        await update.message.reply_text("⏳ Profillash allaqachon ketmoqda.")
+        return
+    
+    seconds = PROFILE_DEFAULT_SECONDS
+    if context.args and context.args[0].isdigit():
+        seconds = min(max(int(context.args[0]), 1), PROFILE_MAX_SECONDS)
+    profiler.start(PROFILE_INTERVAL, PROFILE_SLOW_CALLBACK)
+    background_tasks.append(asyncio.create_task(finish_profile(context.bot, update.effective_chat.id, seconds)))
+    await update.message.reply_text(f"🔬 Profillash {seconds} soniyaga yoqildi. Hisobot fayl bo'lib keladi.")
+
+async def finish_profile(bot, chat_id: int, seconds: int):
+    """Oyna tugagach profilerni to'xtatib, hisobotni adminga yuborish"""
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        report = profiler.stop()
+    await bot.send_document(
+        chat_id=chat_id,
+        document=io.BytesIO(report.encode()),
+        filename=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.txt",
+        caption=f"🔬 Profil ({seconds}s)"
+    )
+
 # /new - Barchaga xabar yuborish
 async def new(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("Siz admin emassiz.")
         return
     
+    if active_broadcast:
+        await update.message.reply_text("⏳ Oldingi broadcast hali tugamagan. To'xtatish: /stopbroadcast")
+        return
+    
     await update.message.reply_text("📨 Barchaga yuboriladigan xabarni kiriting (matn yoki rasm):")
     context.user_data['waiting_for'] = 'broadcast'
 
@@ -470,12 +1278,37 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.message.document and update.message.document.file_name.endswith('.apk'):
             file_id = update.message.document.file_id
             apk_data['file_id'] = file_id
-            save_apk(apk_data)
+            await storage.save_apk(apk_data)
+            await config_changed()
             await update.message.reply_text("✅ APK yuklandi!")
         else:
             await update.message.reply_text("❌ .apk fayl yuboring!")
         context.user_data.clear()
     
+    # Kuponlar importi
+    elif waiting_for == 'kupon_import':
+        document = update.message.document
+        if not document or not document.file_name or not document.file_name.lower().endswith(('.json', '.csv')):
+            await update.message.reply_text("❌ .json yoki .csv fayl yuboring!")
+            return
+        if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+            await update.message.reply_text(f"❌ Fayl {MAX_IMPORT_BYTES // 1024} KB dan katta!")
+            context.user_data.clear()
+            return
+        file = await document.get_file()
+        data = bytes(await file.download_as_bytearray())
+        upserts, deletes, errors = parse_coupons(data, document.file_name)
+        if errors:
+            await update.message.reply_text("❌ Import bekor qilindi:\n" + "\n".join(errors[:20]))
+        else:
+            added, updated, deleted = await apply_coupon_batch(
+                upserts, deletes, context.user_data.get('import_replace', False)
+            )
+            await update.message.reply_text(
+                f"✅ Import: {added} ta qo'shildi, {updated} ta yangilandi, {deleted} ta o'chirildi."
+            )
+        context.user_data.clear()
+    
     # Kupon nomi
     elif waiting_for == 'kupon_name':
         context.user_data['kupon_name'] = update.message.text
@@ -497,12 +1330,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if update.message.photo:
             photo_id = update.message.photo[-1].file_id
         
-        games_data[name] = {
-            'text': text,
-            'photo_id': photo_id,
-            'views': 0
-        }
-        save_games(games_data)
+        await add_game(name, text, photo_id)
         await update.message.reply_text(f"✅ '{name}' kuponi qo'shildi!")
         context.user_data.clear()
     
@@ -511,7 +1339,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         name = update.message.text.strip()
         if name in games_data:
             del games_data[name]
-            save_games(games_data)
+            drop_pending_views(name)
+            invalidate_games()
+            await storage.delete_game(name)
+            await config_changed()
             await update.message.reply_text(f"✅ '{name}' kuponi o'chirildi!")
         else:
             await update.message.reply_text("❌ Bunday kupon topilmadi!")
@@ -520,29 +1351,176 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Broadcast
     elif waiting_for == 'broadcast':
         message = update.message
-        success = 0
-        fail = 0
+        if message.text:
+            payload = {"text": message.text}
+        elif message.photo:
+            payload = {"photo": message.photo[-1].file_id, "caption": message.caption}
+        else:
+            await update.message.reply_text("❌ Matn yoki rasm yuboring!")
+            return
         
         status = await update.message.reply_text("📨 Xabar yuborilmoqda...")
-        
-        for user_id_str in users_data.keys():
-            try:
-                if message.text:
-                    await context.bot.send_message(chat_id=int(user_id_str), text=message.text)
-                elif message.photo:
-                    await context.bot.send_photo(
-                        chat_id=int(user_id_str),
-                        photo=message.photo[-1].file_id,
-                        caption=message.caption
-                )
-                success += 1
-            except:
-                fail += 1
-        
-        await status.edit_text(f"✅ Yuborildi: {success}\n❌ Yuborilmadi: {fail}")
-        await update.message.reply_text("✅ Broadcast tugadi!")
+        state = {
+            "payload": payload,
+            "chat_id": status.chat_id,
+            "message_id": status.message_id,
+            "cursor": None,
+            "ok": 0,
+            "fail": 0,
+            "blocked": 0
+        }
+        await storage.set_meta("broadcast", state)
+        start_broadcast(context.bot, state)
+        await update.message.reply_text("✅ Broadcast fonda boshlandi. To'xtatish: /stopbroadcast")
         context.user_data.clear()
 
+# ------------------- BROADCAST -------------------
+class TokenBucket:
+    """Global tezlik cheklovchi (token bucket)"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Bitta token olish (kerak bo'lsa kutib turadi)"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Telegram RetryAfter qaytarsa, hamma yuborishlarni to'xtatib turish"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+send_bucket = TokenBucket(BROADCAST_RATE)
+active_broadcast = None  # Joriy Broadcast (bir vaqtda faqat bittasi)
+
+class Broadcast:
+    """Fon rejimidagi broadcast. Holat storage ga saqlanadi, shuning uchun
+    qayta ishga tushgandan keyin to'xtagan joyidan davom etadi."""
+
+    def __init__(self, bot, state: Dict):
+        self.bot = bot
+        self.state = state
+        self.semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self.cancelled = False
+        self.task = None
+
+    async def send_one(self, user_id_str: str) -> str:
+        """Bitta foydalanuvchiga yuborish: "ok", "blocked", "fail" yoki "skipped" qaytaradi"""
+        payload = self.state["payload"]
+        async with self.semaphore:
+            for attempt in range(BROADCAST_RETRIES + 1):
+                if self.cancelled:
+                    return "skipped"
+                await send_bucket.acquire()
+                try:
+                    if payload.get("photo"):
+                        await self.bot.send_photo(
+                            chat_id=int(user_id_str),
+                            photo=payload["photo"],
+                            caption=payload.get("caption")
+                        )
+                    else:
+                        await self.bot.send_message(chat_id=int(user_id_str), text=payload["text"])
+                    return "ok"
+                except RetryAfter as e:
+                    send_bucket.pause(e.retry_after)
+                except Forbidden:
+                    # Botni bloklagan: keyingi broadcastlarda o'tkazib yuboriladi
+                    await storage.update_user(user_id_str, {"blocked": True})
+                    return "blocked"
+                except BadRequest as e:
+                    # "chat not found" kabi doimiy xatolar (BadRequest NetworkError vorisi,
+                    # shuning uchun undan oldin ushlanadi - qayta urinish foyda bermaydi)
+                    logger.warning(f"Broadcast xatolik ({user_id_str}): {e}")
+                    return "fail"
+                except NetworkError:
+                    await asyncio.sleep(2 ** attempt)
+                except TelegramError as e:
+                    logger.warning(f"Broadcast xatolik ({user_id_str}): {e}")
+                    return "fail"
+        return "fail"
+
+    def progress_text(self, finished: bool = False) -> str:
+        header = "✅ Broadcast tugadi!" if finished else "📨 Xabar yuborilmoqda..."
+        if self.cancelled:
+            header = "⛔️ Broadcast to'xtatildi."
+        return (
+            f"{header}\n\n"
+            f"✅ Yuborildi: {self.state['ok']}\n"
+            f"❌ Yuborilmadi: {self.state['fail']}\n"
+            f"🚫 Bloklagan: {self.state['blocked']}"
+        )
+
+    async def update_status(self, finished: bool = False):
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.state["chat_id"],
+                message_id=self.state["message_id"],
+                text=self.progress_text(finished)
+            )
+        except TelegramError:
+            pass
+
+    async def run(self):
+        global active_broadcast
+        last_progress = time.monotonic()
+        try:
+            async for user_ids, cursor in storage.iter_user_ids(
+                BROADCAST_BATCH, cursor=self.state["cursor"], active_only=True
+            ):
+                if self.cancelled:
+                    break
+                results = await asyncio.gather(*(self.send_one(uid) for uid in user_ids))
+                for result in results:
+                    if result != "skipped":
+                        self.state[result] += 1
+                self.state["cursor"] = cursor
+                await storage.set_meta("broadcast", self.state)
+                if time.monotonic() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+                    last_progress = time.monotonic()
+                    await self.update_status()
+            await storage.set_meta("broadcast", None)
+            await self.update_status(finished=True)
+        except Exception as e:
+            logger.error(f"Broadcast to'xtadi: {e}")
+        finally:
+            active_broadcast = None
+
+def start_broadcast(bot, state: Dict) -> Broadcast:
+    """Broadcastni fon vazifasi sifatida ishga tushirish"""
+    global active_broadcast
+    active_broadcast = Broadcast(bot, state)
+    active_broadcast.task = asyncio.create_task(active_broadcast.run())
+    return active_broadcast
+
+# /stopbroadcast - Joriy broadcastni to'xtatish
+async def stopbroadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Siz admin emassiz.")
+        return
+    
+    if not active_broadcast:
+        await update.message.reply_text("Hozir hech qanday broadcast ketmayapti.")
+        return
+    
+    active_broadcast.cancelled = True
+    await update.message.reply_text("⛔️ Broadcast to'xtatilmoqda...")
+
 # ------------------- SKIP -------------------
 async def skip(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -552,12 +1530,7 @@ async def skip(update: Update, context: ContextTypes.DEFAULT_TYPE):
         name = context.user_data['kupon_name']
         text = context.user_data['kupon_text']
         
-        games_data[name] = {
-            'text': text,
-            'photo_id': None,
-            'views': 0
-        }
-        save_games(games_data)
+        await add_game(name, text, None)
         await update.message.reply_text(f"✅ '{name}' kuponi qo'shildi!")
         context.user_data.clear()
     else:
@@ -565,34 +1538,176 @@ async def skip(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
 
 # ------------------- MAIN -------------------
+background_tasks = []  # To'xtashda bekor qilinadigan fon vazifalari
+metrics_server = None
+
+def wrap_handler(handler, branch_key: str = None):
+    """Handlerni flood nazorati, o'lchash va foydalanuvchi lock i bilan o'rash"""
+    return flood_control(per_user(timed(handler, branch_key)))
+
+async def post_init(app: Application):
+    """Fon vazifalarini ishga tushirish"""
+    global metrics_server, shard_client
+    await storage.start()
+    if BOT_ROLE == "worker":
+        shard_client = ShardClient(WORKER_URLS, SHARD_SECRET)
+    await admin_stats.load()
+    if owns(ADMIN_ID):
+        # Kuponlarni faqat admin foydalanuvchisining workeri o'zgartiradi
+        await assign_game_ids()
+    if METRICS_PORT:
+        metrics_server = await metrics.start_server(METRICS_PORT)
+        background_tasks.append(asyncio.create_task(loop_lag_monitor()))
+    background_tasks.append(asyncio.create_task(views_flusher()))
+    coupon_scheduler.start()
+    background_tasks.append(coupon_scheduler.task)
+    await bonus_scheduler.load()
+    bonus_scheduler.start(app.bot)
+    background_tasks.append(bonus_scheduler.task)
+    
+    # Qayta ishga tushishdan oldin tugamay qolgan broadcastni davom ettirish
+    state = await storage.get_meta("broadcast") if owns(ADMIN_ID) else None
+    if state:
+        logger.info("Tugallanmagan broadcast davom ettirilmoqda...")
+        start_broadcast(app.bot, state)
+
+async def post_shutdown(app: Application):
+    """To'xtashdan oldin xotiradagi holatni saqlash"""
+    if active_broadcast:
+        # Holat har bir bo'lakdan keyin saqlangan: keyingi ishga tushishda davom etadi
+        background_tasks.append(active_broadcast.task)
+    background_tasks.extend(bonus_scheduler.notifications)
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await flush_views()
+    await storage.close()
+    if shard_client:
+        await shard_client.close()
+    if metrics_server:
+        metrics_server.close()
+
+def application_builder():
+    """Bot API sozlamalari bilan Application builder"""
+    return (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"{BOT_API_URL}/bot")
+        .base_file_url(f"{BOT_API_URL}/file/bot")
+        .request(InstrumentedRequest(connection_pool_size=BOT_API_POOL_SIZE))
+        .concurrent_updates(CONCURRENT_UPDATES)
+    )
+
+def serve_telegram(app: Application):
+    """Telegramdan updatelarni olish: webhook yoki polling"""
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise SystemExit("Webhook rejimi uchun WEBHOOK_URL (yoki RAILWAY_PUBLIC_DOMAIN) kerak")
+        if not WEBHOOK_SECRET:
+            raise SystemExit("Webhook rejimi uchun WEBHOOK_SECRET kerak (A-Z, a-z, 0-9, _ va -)")
+        logger.info(f"✅ Bot webhook rejimida ishga tushdi (port {WEBHOOK_PORT}, /{WEBHOOK_PATH})")
+        # To'xtash signalida post_shutdown orqali xotiradagi holat saqlanadi
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        logger.info("✅ Bot ishga tushdi...")
+        app.run_polling()
+
+def run_router():
+    """Router: Telegramdan updatelarni olib, foydalanuvchi bo'yicha workerlarga uzatadi"""
+    client = ShardClient(WORKER_URLS, SHARD_SECRET, BOT_API_POOL_SIZE)
+
+    async def route(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await client.forward(update)
+
+    async def close(app: Application):
+        await client.close()
+
+    app = application_builder().get_updates_request(InstrumentedRequest()).post_shutdown(close).build()
+    # per_user: bitta foydalanuvchining updatelari workerga kelgan tartibda uzatiladi
+    app.add_handler(TypeHandler(Update, per_user(route)))
+    logger.info(f"Router: {len(WORKER_URLS)} ta worker")
+    serve_telegram(app)
+
+def run_worker(app: Application):
+    """Worker: updatelar routerdan HTTP orqali keladi, Telegramdan to'g'ridan-to'g'ri olinmaydi"""
+    async def on_update(data: Dict):
+        await app.update_queue.put(Update.de_json(data, app.bot))
+
+    async def serve():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await app.initialize()
+        await post_init(app)
+        await app.start()
+        server = start_worker_server(worker_port(WORKER_URLS[SHARD_INDEX]), SHARD_SECRET, on_update, reload_config)
+        logger.info(f"✅ Worker {SHARD_INDEX}/{len(WORKER_URLS)} ishga tushdi")
+        await stop.wait()
+        server.stop()
+        await app.stop()
+        await post_shutdown(app)
+        await app.shutdown()
+
+    asyncio.run(serve())
+
 def main():
-    app = Application.builder().token(TOKEN).build()
+    if BOT_ROLE in ("router", "worker") and not (WORKER_URLS and SHARD_SECRET):
+        raise SystemExit("Router/worker rejimi uchun WORKER_URLS va SHARD_SECRET kerak")
+    if BOT_ROLE == "router":
+        run_router()
+        return
+    if BOT_ROLE == "worker" and STORAGE_BACKEND != "mongo":
+        # Balanslar bir nechta jarayondan atomar o'zgartirilishi kerak
+        raise SystemExit("Worker rejimi umumiy storage talab qiladi (STORAGE_BACKEND=mongo)")
+
+    builder = application_builder().post_init(post_init).post_shutdown(post_shutdown)
+    if BOT_ROLE == "worker":
+        builder = builder.updater(None)
+    else:
+        builder = builder.get_updates_request(InstrumentedRequest())
+    app = builder.build()
 
-    # Asosiy handlerlar
-    app.add_handler(CommandHandler("start", start))
+    # Asosiy handlerlar (bir foydalanuvchining updatelari wrap_handler orqali ketma-ket)
+    app.add_handler(CommandHandler("start", wrap_handler(start)))
     
     # Admin buyruqlari
-    app.add_handler(CommandHandler("newapk", newapk))
-    app.add_handler(CommandHandler("deleteapk", deleteapk))
-    app.add_handler(CommandHandler("newkupon", newkupon))
-    app.add_handler(CommandHandler("deletekupon", deletekupon))
-    app.add_handler(CommandHandler("new", new))
-    app.add_handler(CommandHandler("skip", skip))
+    app.add_handler(CommandHandler("newapk", wrap_handler(newapk)))
+    app.add_handler(CommandHandler("deleteapk", wrap_handler(deleteapk)))
+    app.add_handler(CommandHandler("newkupon", wrap_handler(newkupon)))
+    app.add_handler(CommandHandler("deletekupon", wrap_handler(deletekupon)))
+    app.add_handler(CommandHandler("importkupon", wrap_handler(importkupon)))
+    app.add_handler(CommandHandler("exportkupon", wrap_handler(exportkupon)))
+    app.add_handler(CommandHandler("views", wrap_handler(views)))
+    app.add_handler(CommandHandler("stats", wrap_handler(stats)))
+    app.add_handler(CommandHandler("profile", wrap_handler(profile)))
+    app.add_handler(CommandHandler("new", wrap_handler(new)))
+    app.add_handler(CommandHandler("stopbroadcast", wrap_handler(stopbroadcast)))
+    app.add_handler(CommandHandler("skip", wrap_handler(skip)))
     
     # Callback handlerlar
-    app.add_handler(CallbackQueryHandler(show_games, pattern="^show_games$"))
-    app.add_handler(CallbackQueryHandler(show_apk, pattern="^show_apk$"))
-    app.add_handler(CallbackQueryHandler(game_callback, pattern="^game_"))
-    app.add_handler(CallbackQueryHandler(earn_callback, pattern="^earn$"))
-    app.add_handler(CallbackQueryHandler(balance_callback, pattern="^balance$"))
-    app.add_handler(CallbackQueryHandler(withdraw_callback, pattern="^withdraw$"))
-    app.add_handler(CallbackQueryHandler(back_to_main, pattern="^main_menu$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(show_games), pattern=r"^(show_games|games_page_\d+)$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(show_apk), pattern="^show_apk$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(game_callback), pattern="^game_"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(earn_callback), pattern="^earn$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(balance_callback), pattern="^balance$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(withdraw_callback), pattern="^withdraw$"))
+    app.add_handler(CallbackQueryHandler(wrap_handler(back_to_main), pattern="^main_menu$"))
     
     # Xabarlarni qabul qilish
-    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, wrap_handler(handle_message, branch_key="waiting_for")))
 
-    logger.info("✅ Bot ishga tushdi...")
-    app.run_polling()
+    if BOT_ROLE == "worker":
+        run_worker(app)
+    else:
+        serve_telegram(app)
 
 if __name__ == "__main__":
     main()
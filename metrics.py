@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prometheus matn formatidagi oddiy metrikalar (tashqi kutubxonasiz).
+# Qiymatlar oqimlardan ham yangilanadi (saqlash ishchisi), shuning uchun lock bilan.
+REGISTRY: List["Metric"] = []
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _labels_key(labels: Dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self.samples())
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+class Gauge(Metric):
+    """Qiymat set() bilan o'rnatiladi yoki har so'rovda fn() dan olinadi"""
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        self.fn = fn
+        self.values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[_labels_key(labels)] = value
+
+    def samples(self) -> List[str]:
+        if self.fn:
+            return [f"{self.name} {self.fn()}"]
+        with self.lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+        self.values: Dict[Tuple, list] = {}  # labels -> [bucket hisoblari..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, data in self.values.items():
+                for bound, count in zip(self.buckets, data):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {data[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {data[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]}")
+        return lines
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+# ------------------- HTTP ENDPOINT -------------------
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        # Sarlavhalarni o'qib tashlash
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split()[1] if len(request_line.split()) > 1 else b"/"
+        if path.startswith(b"/metrics"):
+            body, status = render().encode(), "200 OK"
+        else:
+            body, status = b"Not Found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def start_server(port: int, host: str = "0.0.0.0"):
+    """GET /metrics ni Prometheus formatida beruvchi HTTP server"""
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info(f"Metrikalar: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,156 @@
+"""Talab bo'yicha profillash: namunaviy (sampling) profiler va sekin callbacklar.
+
+O'chiq paytida hech narsa ishlamaydi. Yoqilganda alohida oqim har `interval`
+soniyada barcha oqimlarning steklarini oladi (sys._current_frames), event loop
+debug rejimiga o'tib sekin callbacklarni yozadi, handlerlar esa record_handler
+orqali o'z vaqtlarini qo'shadi. stop() matnli hisobot qaytaradi.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+TOP_FUNCTIONS = 30
+TOP_HANDLERS = 20
+TOP_CALLBACKS = 20
+
+FrameKey = Tuple[str, int, str]  # (fayl, qator, funksiya)
+
+class _SlowCallbackHandler(logging.Handler):
+    """asyncio debug rejimidagi "Executing <...> took X seconds" yozuvlarini yig'ish"""
+
+    def __init__(self, sink: List[Tuple[float, str]]):
+        super().__init__(logging.WARNING)
+        self.sink = sink
+
+    def emit(self, record: logging.LogRecord):
+        message = record.getMessage()
+        if not message.startswith("Executing "):
+            return
+        try:
+            seconds = float(message.rsplit(" took ", 1)[1].split()[0])
+        except (IndexError, ValueError):
+            seconds = 0.0
+        self.sink.append((seconds, message))
+
+class Profiler:
+    def __init__(self):
+        self.active = False
+        self._reset()
+
+    def _reset(self):
+        self.started = 0.0
+        self.interval = 0.005
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.handlers: List[Tuple[float, str]] = []  # eng sekin chaqiruvlar (min-heap)
+        self.handler_totals: Counter = Counter()
+        self.handler_calls: Counter = Counter()
+        self.slow_callbacks: List[Tuple[float, str]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop = None
+        self._log_handler = None
+
+    # ---------- Boshqarish ----------
+    def start(self, interval: float = 0.005, slow_callback: float = 0.05):
+        """Profillashni boshlash (event loop ichidan chaqiriladi)"""
+        if self.active:
+            raise RuntimeError("Profiler allaqachon ishlayapti")
+        self._reset()
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._loop = asyncio.get_running_loop()
+        self._loop.slow_callback_duration = slow_callback
+        self._loop.set_debug(True)
+        self._log_handler = _SlowCallbackHandler(self.slow_callbacks)
+        logging.getLogger("asyncio").addHandler(self._log_handler)
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        self.active = True
+
+    def stop(self) -> str:
+        """Profillashni to'xtatib, hisobot matnini qaytarish"""
+        if not self.active:
+            return ""
+        self.active = False
+        self._stop.set()
+        self._thread.join()
+        self._loop.set_debug(False)
+        logging.getLogger("asyncio").removeHandler(self._log_handler)
+        return self.report(time.perf_counter() - self.started)
+
+    # ---------- Yig'ish ----------
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                seen = set()
+                top = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if top:
+                        self.self_counts[key] += 1
+                        top = False
+                    if key not in seen:
+                        seen.add(key)
+                        self.total_counts[key] += 1
+                    frame = frame.f_back
+                self.samples += 1
+
+    def record_handler(self, label: str, seconds: float, detail: str = ""):
+        """Handler chaqiruvi vaqtini qo'shish (faqat active bo'lganda chaqiriladi)"""
+        self.handler_totals[label] += seconds
+        self.handler_calls[label] += 1
+        entry = (seconds, f"{label} {detail}".rstrip())
+        if len(self.handlers) < TOP_HANDLERS:
+            heapq.heappush(self.handlers, entry)
+        elif entry > self.handlers[0]:
+            heapq.heapreplace(self.handlers, entry)
+
+    # ---------- Hisobot ----------
+    @staticmethod
+    def _name(key: FrameKey) -> str:
+        filename, line, function = key
+        return f"{function} ({os.path.basename(filename)}:{line})"
+
+    def _top(self, counts: Counter) -> List[str]:
+        total = max(self.samples, 1)
+        return [
+            f"  {count * 100 / total:6.2f}%  {count:7d}  {self._name(key)}"
+            for key, count in counts.most_common(TOP_FUNCTIONS)
+        ]
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            f"Profil: {elapsed:.1f}s, {self.samples} namuna (har {self.interval * 1000:.1f}ms, barcha oqimlar)",
+            "",
+            "Eng ko'p vaqt olgan funksiyalar (o'zi):",
+            *self._top(self.self_counts),
+            "",
+            "Eng ko'p vaqt olgan funksiyalar (chaqirganlari bilan):",
+            *self._top(self.total_counts),
+            "",
+            "Handlerlar (jami vaqt, chaqiruvlar, o'rtacha):",
+        ]
+        for label, total in self.handler_totals.most_common():
+            calls = self.handler_calls[label]
+            lines.append(f"  {total:9.3f}s  {calls:7d}  {total / calls * 1000:9.3f}ms  {label}")
+        lines += ["", "Eng sekin handler chaqiruvlari:"]
+        for seconds, label in sorted(self.handlers, reverse=True):
+            lines.append(f"  {seconds * 1000:9.3f}ms  {label}")
+        lines += ["", f"Sekin callbacklar ({len(self.slow_callbacks)} ta):"]
+        for seconds, message in heapq.nlargest(TOP_CALLBACKS, self.slow_callbacks):
+            lines.append(f"  {seconds * 1000:9.3f}ms  {message}")
+        return "\n".join(lines) + "\n"
+
+profiler = Profiler()
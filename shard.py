@@ -0,0 +1,112 @@
+"""Bir nechta worker jarayonlari uchun updatelarni foydalanuvchi bo'yicha taqsimlash.
+
+Router Telegramdan (polling yoki webhook) update oladi va uni
+shard_of(effective_user.id) raqamli workerga POST /update qilib uzatadi, shuning
+uchun bitta foydalanuvchining updatelari doim bitta workerga tushadi. Workerlar
+umumiy storage (MongoDB) bilan ishlaydi; admin kuponlar/APK ni o'zgartirsa,
+qolgan workerlarga POST /reload yuboriladi.
+
+Workerlar orasidagi so'rovlar X-Shard-Secret sarlavhasi bilan tekshiriladi.
+"""
+import asyncio
+import json
+import logging
+import zlib
+from typing import Awaitable, Callable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from telegram import Update
+from tornado.web import Application, RequestHandler
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Shard-Secret"
+FORWARD_RETRIES = 3  # Worker javob bermasa qayta urinishlar soni
+
+def shard_of(user_id: Optional[int], shards: int) -> int:
+    """Foydalanuvchi qaysi workerga tegishli (barqaror hash; user_id yo'q bo'lsa 0)"""
+    if user_id is None or shards <= 1:
+        return 0
+    return zlib.crc32(str(user_id).encode()) % shards
+
+def worker_port(url: str) -> int:
+    """WORKER_URLS dagi manzildan tinglanadigan port"""
+    parts = urlsplit(url)
+    return parts.port or (443 if parts.scheme == "https" else 80)
+
+class ShardClient:
+    """Workerlarga so'rov yuboruvchi HTTP klient (ulanishlar qayta ishlatiladi)"""
+
+    def __init__(self, worker_urls: List[str], secret: str, pool_size: int = 100):
+        self.worker_urls = [url.rstrip("/") for url in worker_urls]
+        self.headers = {SECRET_HEADER: secret, "Content-Type": "application/json"}
+        self.client = httpx.AsyncClient(
+            timeout=10, limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def forward(self, update: Update) -> int:
+        """Updateni egasi bo'lgan workerga uzatish, worker raqamini qaytaradi"""
+        user = update.effective_user
+        shard = shard_of(user.id if user else None, len(self.worker_urls))
+        body = json.dumps(update.to_dict())
+        for attempt in range(FORWARD_RETRIES + 1):
+            try:
+                response = await self.client.post(
+                    f"{self.worker_urls[shard]}/update", content=body, headers=self.headers
+                )
+                response.raise_for_status()
+                return shard
+            except httpx.HTTPError as e:
+                if attempt == FORWARD_RETRIES:
+                    raise
+                logger.warning(f"Worker {shard} javob bermadi ({e}), qayta urinish...")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        return shard
+
+    async def reload_peers(self, own_shard: int):
+        """Boshqa workerlarga kuponlar/APK ni storage dan qayta o'qishni aytish"""
+        async def reload(url: str):
+            try:
+                response = await self.client.post(f"{url}/reload", content=b"{}", headers=self.headers)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.error(f"{url} ga reload yuborilmadi: {e}")
+        await asyncio.gather(*(
+            reload(url) for shard, url in enumerate(self.worker_urls) if shard != own_shard
+        ))
+
+    async def close(self):
+        await self.client.aclose()
+
+class _ShardHandler(RequestHandler):
+    def initialize(self, secret: str, callback: Callable[[dict], Awaitable[None]]):
+        self.secret = secret
+        self.callback = callback
+
+    async def post(self):
+        if self.request.headers.get(SECRET_HEADER) != self.secret:
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            self.set_status(400)
+            return
+        await self.callback(data)
+        self.set_status(200)
+
+def start_worker_server(
+    port: int,
+    secret: str,
+    on_update: Callable[[dict], Awaitable[None]],
+    on_reload: Callable[[dict], Awaitable[None]],
+):
+    """Worker HTTP serverini ishga tushirish (POST /update va POST /reload)"""
+    app = Application([
+        (r"/update", _ShardHandler, {"secret": secret, "callback": on_update}),
+        (r"/reload", _ShardHandler, {"secret": secret, "callback": on_reload}),
+    ])
+    server = app.listen(port)
+    logger.info(f"Worker serveri: {port}-port")
+    return server
@@ -0,0 +1,752 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+import os
+import time
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pymongo import DeleteOne, MongoClient, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from metrics import Counter, Histogram
+from usertable import CodeSet, UserTable, load_binary, save_binary
+
+logger = logging.getLogger(__name__)
+
+PERSIST_RETRY = 5  # Yozish xato bersa qayta urinish oralig'i (soniya)
+
+STORAGE_SECONDS = Histogram("bot_storage_seconds", "Saqlash amallari davomiyligi (op, file)")
+STORAGE_BYTES = Counter("bot_storage_bytes_total", "O'qilgan va yozilgan baytlar (op, file)")
+
+def observe_io(op: str, path: str, started: float, size: int):
+    name = os.path.basename(path)
+    STORAGE_SECONDS.observe(time.perf_counter() - started, op=op, file=name)
+    STORAGE_BYTES.inc(size, op=op, file=name)
+
+# ------------------- FON SAQLASH -------------------
+def atomic_write_json(path: str, data):
+    """Vaqtinchalik faylga yozib, fsync qilib, atomar almashtirish.
+    UserTable bo'laklab yoziladi (butun matn xotirada yig'ilmaydi)."""
+    started = time.perf_counter()
+    chunks = data.iter_json() if isinstance(data, UserTable) else [json.dumps(data)]
+    size = 0
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+    observe_io("write", path, started, size)
+
+def write_users_binary(path: str, users: UserTable):
+    """UserTable ni users.bin ga atomar yozish"""
+    started = time.perf_counter()
+    save_binary(path, users)
+    observe_io("write", path, started, os.path.getsize(path))
+
+def append_lines(path: str, lines: List[str]):
+    """Qatorlarni faylga qo'shib, fsync qilish"""
+    started = time.perf_counter()
+    payload = "".join(lines)
+    with open(path, "a") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    observe_io("append", path, started, len(payload))
+
+class PersistWorker:
+    """Saqlash so'rovlarini birlashtirib, event loopdan tashqarida (oqimda) yozadi"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.snapshots: Dict[str, Tuple[Callable, Callable]] = {}  # fayl -> (snapshot funksiyasi, yozuvchi)
+        self.logs: Dict[str, List[str]] = {}                  # fayl -> qo'shiladigan qatorlar
+        self.lock = asyncio.Lock()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task = None
+        self.stopping = False
+
+    def save(self, path: str, snapshot_fn: Callable[[], object], writer: Callable = atomic_write_json):
+        """Faylni to'liq qayta yozishni so'rash (ketma-ket so'rovlar bitta yozuvga birlashadi)"""
+        if self.task is None:
+            writer(path, snapshot_fn())
+            return
+        self.snapshots[path] = (snapshot_fn, writer)
+        self.wakeup.set()
+
+    def append(self, path: str, line: str):
+        """Faylga qator qo'shishni so'rash"""
+        if self.task is None:
+            append_lines(path, [line])
+            return
+        self.logs.setdefault(path, []).append(line)
+        self.wakeup.set()
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self.stopping:
+            await self.wakeup.wait()
+            # Qisqa kutish: shu orada kelgan so'rovlar bitta yozuvga birlashadi
+            await asyncio.sleep(self.delay)
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Yozilmagan so'rovlar navbatda qoladi, keyinroq qayta urinamiz
+                logger.error(f"Saqlashda xatolik: {e}, {PERSIST_RETRY} soniyadan keyin qayta urinish")
+                await asyncio.sleep(PERSIST_RETRY)
+                self.wakeup.set()
+
+    async def flush_logs(self):
+        """Navbatdagi qatorlarni fayllarga qo'shish (self.lock ushlangan holda chaqiriladi).
+        Xato bo'lsa yozilmagan qatorlar navbat boshiga qaytariladi."""
+        logs, self.logs = self.logs, {}
+        try:
+            while logs:
+                path, lines = next(iter(logs.items()))
+                await asyncio.to_thread(append_lines, path, lines)
+                del logs[path]
+        finally:
+            for path, lines in logs.items():
+                self.logs[path] = lines + self.logs.get(path, [])
+
+    async def flush(self):
+        """Navbatdagi barcha yozuvlarni diskka tushirish"""
+        async with self.lock:
+            await self.flush_logs()
+            snapshots, self.snapshots = self.snapshots, {}
+            try:
+                while snapshots:
+                    path, (snapshot_fn, writer) = next(iter(snapshots.items()))
+                    await asyncio.to_thread(writer, path, snapshot_fn())
+                    del snapshots[path]
+            finally:
+                # Shu orada yangi so'rov kelgan bo'lsa, u eskisining o'rnini bosadi
+                for path, entry in snapshots.items():
+                    self.snapshots.setdefault(path, entry)
+
+    async def stop(self):
+        """Ishchini to'xtatish va qolgan yozuvlarni saqlash"""
+        if self.task:
+            self.stopping = True
+            self.wakeup.set()
+            await self.task
+            self.task = None
+        await self.flush()
+
+# ------------------- SAQLASH INTERFEYSI -------------------
+class Storage(ABC):
+    """Foydalanuvchilar, kuponlar va APK maʼlumotlari uchun umumiy interfeys.
+
+    Foydalanuvchi yozuvlari faqat shu metodlar orqali o'zgartiriladi:
+    get_user natijasini to'g'ridan-to'g'ri o'zgartirish saqlanmaydi.
+    """
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Foydalanuvchilar
+    @abstractmethod
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def create_user(self, user_id: str, data: Dict) -> Dict:
+        """Foydalanuvchini yaratish; allaqachon mavjud bo'lsa o'sha yozuv qaytadi"""
+
+    @abstractmethod
+    async def update_user(self, user_id: str, fields: Dict) -> Optional[Dict]:
+        """Maydonlarni o'rnatish ($set)"""
+
+    @abstractmethod
+    async def inc_user(self, user_id: str, deltas: Dict[str, int]) -> Optional[Dict]:
+        """Sonli maydonlarni atomar oshirish ($inc), yangilangan yozuvni qaytaradi"""
+
+    @abstractmethod
+    async def find_user_by_referral_code(self, code: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def claim_referral(self, user_id: str, referrer_id: str) -> bool:
+        """referred_by ni atomar o'rnatish; avval o'rnatilgan bo'lsa False"""
+
+    @abstractmethod
+    async def grant_start_bonus(self, user_id: str, amount: int) -> Optional[Dict]:
+        """Start bonusini atomar berish; bonus avval berilgan bo'lsa None"""
+
+    @abstractmethod
+    async def pending_bonuses(self) -> List[Tuple[float, str]]:
+        """Rejalashtirilgan, hali berilmagan start bonuslari: (bonus_due_at, user_id)"""
+
+    @abstractmethod
+    async def reserve_code(self, code: str) -> bool:
+        """7 xonali kodni band qilish; kod avval band qilingan bo'lsa False"""
+
+    @abstractmethod
+    async def user_totals(self, top: int) -> Dict:
+        """Barcha foydalanuvchilar bo'yicha yig'indilar (statistikani bir marta tiklash uchun):
+        users, balance, referrals, start_bonuses va top_referrers [[user_id, referrals], ...]"""
+
+    @abstractmethod
+    def iter_user_ids(
+        self, batch_size: int = 1000, cursor=None, active_only: bool = False
+    ) -> AsyncIterator[Tuple[List[str], object]]:
+        """Foydalanuvchi ID larini bo'laklab qaytarish: (ids, keyingi_cursor).
+
+        cursor orqali to'xtagan joydan davom ettirish mumkin; active_only=True
+        bo'lsa botni bloklaganlar (blocked) tashlab ketiladi.
+        """
+
+    # Kichik holat yozuvlari (broadcast va h.k.)
+    @abstractmethod
+    async def get_meta(self, key: str):
+        ...
+
+    @abstractmethod
+    async def set_meta(self, key: str, value):
+        """Qiymatni saqlash; None bo'lsa o'chirish"""
+
+    # Kuponlar
+    @abstractmethod
+    def load_games(self) -> Dict:
+        ...
+
+    @abstractmethod
+    async def save_game(self, name: str, game: Dict):
+        ...
+
+    @abstractmethod
+    async def delete_game(self, name: str):
+        ...
+
+    @abstractmethod
+    async def apply_games(self, upserts: Dict[str, Dict], deletes: List[str]):
+        """Kuponlar to'plamini bitta yozuv bilan o'zgartirish (ommaviy import)"""
+
+    @abstractmethod
+    async def archive_games(self, records: List[Dict]):
+        """Muddati o'tgan kuponlarni (ko'rishlari bilan) arxivga qo'shish; arxiv yuklanmaydi"""
+
+    @abstractmethod
+    async def add_views(self, counts: Dict[str, int]):
+        """Kuponlar ko'rishlarini atomar oshirish"""
+
+    # APK
+    @abstractmethod
+    def load_apk(self) -> Dict:
+        ...
+
+    @abstractmethod
+    async def save_apk(self, apk_data: Dict):
+        ...
+
+# ------------------- JSON FAYLLAR -------------------
+class JsonStorage(Storage):
+    """Hamma narsa xotirada, diskda esa users.json + users.log, games.json, apk.json va state.json
+    (arxivlangan kuponlar games_archive.jsonl ga faqat qo'shiladi).
+
+    Foydalanuvchilar xotirada ixcham UserTable ko'rinishida turadi. users_bin_file
+    berilsa va binary_snapshot rost bo'lsa, snapshot users.json o'rniga shu binar
+    faylga yoziladi. Yuklashda ikkala snapshotdan eng yangisi o'qiladi (format
+    almashtirilganda eskisi diskda qoladi), so'ng u sozlangan formatga siqiladi.
+    """
+
+    def __init__(
+        self,
+        users_file: str,
+        users_log_file: str,
+        games_file: str,
+        apk_file: str,
+        state_file: str = "state.json",
+        wal: bool = True,
+        compact_every: int = 5000,
+        persist_delay: float = 0.5,
+        users_bin_file: Optional[str] = None,
+        games_archive_file: str = "games_archive.jsonl",
+        binary_snapshot: bool = True,
+    ):
+        self.users_file = users_file
+        self.users_bin_file = users_bin_file
+        self.binary_snapshot = binary_snapshot and users_bin_file is not None
+        self.users_log_file = users_log_file
+        self.games_file = games_file
+        self.games_archive_file = games_archive_file
+        self.apk_file = apk_file
+        self.state_file = state_file
+        self.wal = wal
+        self.compact_every = compact_every
+        self.persist = PersistWorker(persist_delay)
+        self.users_log_count = 0      # Oxirgi siqishdan beri jurnaldagi yozuvlar soni
+        self.compaction_task = None   # Fon rejimidagi siqish vazifasi
+        self.loaded_snapshot: Optional[str] = None  # Foydalanuvchilar yuklangan snapshot fayli
+        self.users = self._load_users()
+        self.games = self._load_json(games_file, {})
+        self.apk = self._load_json(apk_file, {"file_id": None})
+        self.state = self._load_json(state_file, {})
+        # Band qilingan barcha 7 xonali kodlar (referral va withdraw kodlari)
+        self.used_codes = CodeSet()
+        self._build_indexes()
+
+    async def start(self):
+        self.persist.start()
+        if not self.wal and self.users_log_count:
+            # Jurnal rejimidan o'tilgan: jurnal keyingi ishga tushishda yangi snapshot
+            # ustiga qayta qo'llanmasligi uchun uni birinchi yozuvdan oldin siqish
+            await self.compact()
+        elif self.loaded_snapshot != self._snapshot_file():
+            # Boshqa formatdan (yoki hech narsadan) yuklangan: sozlangan snapshotni darhol yozish,
+            # shunda keyingi ishga tushish tez va eskirgan fayl o'qilmaydi
+            self._schedule_compaction()
+
+    async def close(self):
+        if self.compaction_task:
+            await asyncio.gather(self.compaction_task, return_exceptions=True)
+        await self.persist.stop()
+
+    @staticmethod
+    def _load_json(path: str, default: Dict) -> Dict:
+        if Path(path).exists():
+            started = time.perf_counter()
+            with open(path, "r") as f:
+                data = json.load(f)
+            observe_io("load", path, started, os.path.getsize(path))
+            return data
+        return default
+
+    def _build_indexes(self):
+        """Yuklangan foydalanuvchilar kodlarini bir marta band qilish
+        (referral_code -> user_id indeksini UserTable o'zi yuritadi)"""
+        for key in self.users.code_keys():
+            self.used_codes.add_key(key)
+
+    # ---------- Jurnal ----------
+    def _replay_log(self, users: UserTable, log_file: str) -> int:
+        """Jurnal yozuvlarini snapshot ustiga qo'llash, qo'llangan yozuvlar sonini qaytaradi"""
+        if not Path(log_file).exists():
+            return 0
+        started = time.perf_counter()
+        count = 0
+        with open(log_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Oxirgi yozuv chala qolgan (jarayon yozish paytida to'xtagan)
+                    logger.warning(f"{log_file}: buzilgan yozuv tashlab ketildi")
+                    break
+                users.set(record["id"], record["data"])
+                count += 1
+        observe_io("replay", log_file, started, os.path.getsize(log_file))
+        return count
+
+    def _newest_snapshot(self) -> Optional[str]:
+        """Mavjud snapshotlardan eng yangisi (bir xil bo'lsa sozlangani)"""
+        existing = [path for path in (self.users_bin_file, self.users_file) if path and Path(path).exists()]
+        return max(
+            existing,
+            key=lambda path: (os.stat(path).st_mtime_ns, path == self._snapshot_file()),
+            default=None,
+        )
+
+    def _load_users(self) -> UserTable:
+        self.loaded_snapshot = self._newest_snapshot()
+        if self.loaded_snapshot and self.loaded_snapshot == self.users_bin_file:
+            started = time.perf_counter()
+            users = load_binary(self.users_bin_file)
+            observe_io("load", self.users_bin_file, started, os.path.getsize(self.users_bin_file))
+        else:
+            users = UserTable.from_dict(self._load_json(self.users_file, {}))
+        # Siqish paytida qolgan eski jurnal, keyin joriy jurnal
+        self.users_log_count = self._replay_log(users, self.users_log_file + ".old")
+        self.users_log_count += self._replay_log(users, self.users_log_file)
+        return users
+
+    def _save_user(self, user_id: str):
+        """Bitta foydalanuvchi o'zgarishini saqlash (jurnalga bitta qator qo'shish)"""
+        if not self.wal:
+            self.persist.save(self._snapshot_file(), self.users.snapshot, self._snapshot_writer())
+            return
+        record = {"id": user_id, "data": self.users.get(user_id)}
+        self.persist.append(self.users_log_file, json.dumps(record) + "\n")
+        self.users_log_count += 1
+        if self.users_log_count >= self.compact_every:
+            self._schedule_compaction()
+
+    def _rotate_log(self):
+        """users.log ni users.log.old ga o'tkazish (tugallanmagan siqishdan qolgani bilan birlashtirib)"""
+        old_log = self.users_log_file + ".old"
+        if not Path(self.users_log_file).exists():
+            return
+        if Path(old_log).exists():
+            with open(old_log, "a") as old, open(self.users_log_file, "r") as cur:
+                old.write(cur.read())
+            Path(self.users_log_file).unlink()
+        else:
+            os.replace(self.users_log_file, old_log)
+
+    def _snapshot_file(self) -> str:
+        return self.users_bin_file if self.binary_snapshot else self.users_file
+
+    def _snapshot_writer(self) -> Callable:
+        return write_users_binary if self.binary_snapshot else atomic_write_json
+
+    def _write_snapshot(self, users: UserTable):
+        """Snapshotni atomar yozish va eski jurnalni o'chirish"""
+        self._snapshot_writer()(self._snapshot_file(), users)
+        Path(self.users_log_file + ".old").unlink(missing_ok=True)
+
+    async def compact(self):
+        """Jurnalni snapshotga siqish (fayl ishlari alohida oqimda)"""
+        async with self.persist.lock:
+            # Navbatdagi qatorlar avval joriy jurnalga tushadi, keyin jurnal almashtiriladi
+            await self.persist.flush_logs()
+            await asyncio.to_thread(self._rotate_log)
+            self.users_log_count = 0
+            snapshot = self.users.snapshot()
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+        logger.info(f"{self._snapshot_file()} siqildi ({len(snapshot)} foydalanuvchi)")
+
+    def _schedule_compaction(self):
+        """Siqishni fon rejimida ishga tushirish (bir vaqtda faqat bittasi)"""
+        if self.compaction_task and not self.compaction_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.compaction_task = loop.create_task(self.compact())
+        self.compaction_task.add_done_callback(self._compaction_done)
+
+    @staticmethod
+    def _compaction_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"Jurnalni siqishda xatolik: {task.exception()!r}")
+
+    # ---------- Foydalanuvchilar ----------
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        return self.users.get(user_id)
+
+    async def create_user(self, user_id: str, data: Dict) -> Dict:
+        if user_id in self.users:
+            return self.users.get(user_id)
+        self.users.set(user_id, data)
+        self._save_user(user_id)
+        return self.users.get(user_id)
+
+    async def update_user(self, user_id: str, fields: Dict) -> Optional[Dict]:
+        if not self.users.update(user_id, fields):
+            return None
+        self._save_user(user_id)
+        return self.users.get(user_id)
+
+    async def inc_user(self, user_id: str, deltas: Dict[str, int]) -> Optional[Dict]:
+        if not self.users.inc(user_id, deltas):
+            return None
+        self._save_user(user_id)
+        return self.users.get(user_id)
+
+    async def find_user_by_referral_code(self, code: str) -> Optional[str]:
+        return self.users.find_by_referral_code(code)
+
+    async def claim_referral(self, user_id: str, referrer_id: str) -> bool:
+        if user_id not in self.users or self.users.field(user_id, "referred_by"):
+            return False
+        self.users.update(user_id, {"referred_by": referrer_id})
+        self._save_user(user_id)
+        return True
+
+    async def grant_start_bonus(self, user_id: str, amount: int) -> Optional[Dict]:
+        if user_id not in self.users or self.users.field(user_id, "start_bonus_given", False):
+            return None
+        self.users.inc(user_id, {"balance": amount})
+        self.users.update(user_id, {"start_bonus_given": True})
+        self.users.pop(user_id, "bonus_due_at")
+        self._save_user(user_id)
+        return self.users.get(user_id)
+
+    async def pending_bonuses(self) -> List[Tuple[float, str]]:
+        return self.users.pending_bonuses()
+
+    async def reserve_code(self, code: str) -> bool:
+        if code in self.used_codes:
+            return False
+        self.used_codes.add(code)
+        return True
+
+    async def user_totals(self, top: int) -> Dict:
+        return self.users.totals(top)
+
+    async def iter_user_ids(
+        self, batch_size: int = 1000, cursor=None, active_only: bool = False
+    ) -> AsyncIterator[Tuple[List[str], object]]:
+        # Cursor - qo'shilish tartibidagi o'rin (foydalanuvchilar o'chirilmaydi)
+        for i in range(cursor or 0, len(self.users), batch_size):
+            yield self.users.user_ids(i, i + batch_size, active_only), i + batch_size
+
+    async def get_meta(self, key: str):
+        return self.state.get(key)
+
+    async def set_meta(self, key: str, value):
+        if value is None:
+            self.state.pop(key, None)
+        else:
+            self.state[key] = value
+        state = dict(self.state)
+        self.persist.save(self.state_file, lambda: state)
+
+    # ---------- Kuponlar ----------
+    def load_games(self) -> Dict:
+        return {name: dict(game) for name, game in self.games.items()}
+
+    def _save_games(self):
+        games = self.games
+        self.persist.save(
+            self.games_file, lambda: {name: dict(game) for name, game in games.items()}
+        )
+
+    async def save_game(self, name: str, game: Dict):
+        self.games[name] = dict(game)
+        self._save_games()
+
+    async def delete_game(self, name: str):
+        self.games.pop(name, None)
+        self._save_games()
+
+    async def apply_games(self, upserts: Dict[str, Dict], deletes: List[str]):
+        for name in deletes:
+            self.games.pop(name, None)
+        for name, game in upserts.items():
+            self.games[name] = dict(game)
+        self._save_games()
+
+    async def archive_games(self, records: List[Dict]):
+        for record in records:
+            self.persist.append(self.games_archive_file, json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def add_views(self, counts: Dict[str, int]):
+        for name, count in counts.items():
+            game = self.games.get(name)
+            if game:
+                game["views"] = game.get("views", 0) + count
+        self._save_games()
+
+    # ---------- APK ----------
+    def load_apk(self) -> Dict:
+        return dict(self.apk)
+
+    async def save_apk(self, apk_data: Dict):
+        self.apk = dict(apk_data)
+        apk = self.apk
+        self.persist.save(self.apk_file, lambda: dict(apk))
+
+# ------------------- MONGODB -------------------
+class MongoStorage(Storage):
+    """MongoDB kolleksiyalari: users (_id = user_id), games (_id = kupon nomi),
+    codes (band qilingan kodlar), meta (APK va holat yozuvlari) va games_archive
+    (muddati o'tgan kuponlar).
+
+    pymongo sinxron bo'lgani uchun har bir so'rov alohida oqimda bajariladi.
+    Testlarda `client` sifatida mongomock.MongoClient() berish mumkin.
+    """
+
+    def __init__(self, url: str, db_name: str, pool_size: int = 50, client=None):
+        self.client = client or MongoClient(url, maxPoolSize=pool_size)
+        self.db = self.client[db_name]
+        self.users = self.db["users"]
+        self.games = self.db["games"]
+        self.games_archive = self.db["games_archive"]
+        self.codes = self.db["codes"]
+        self.meta = self.db["meta"]
+        self.users.create_index("referral_code", unique=True, sparse=True)
+        self.users.create_index("bonus_due_at", sparse=True)
+
+    async def close(self):
+        self.client.close()
+
+    async def _call(self, op: str, fn, *args, **kwargs):
+        """pymongo chaqiruvini oqimda bajarish va vaqtini o'lchash"""
+        with STORAGE_SECONDS.time(op=op, file="mongo"):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    # ---------- Foydalanuvchilar ----------
+    async def get_user(self, user_id: str) -> Optional[Dict]:
+        return await self._call("get_user", self.users.find_one, {"_id": user_id}, {"_id": 0})
+
+    async def create_user(self, user_id: str, data: Dict) -> Dict:
+        await self._call(
+            "create_user",
+            self.users.update_one, {"_id": user_id}, {"$setOnInsert": data}, upsert=True
+        )
+        return await self.get_user(user_id)
+
+    async def update_user(self, user_id: str, fields: Dict) -> Optional[Dict]:
+        return await self._call(
+            "update_user",
+            self.users.find_one_and_update,
+            {"_id": user_id},
+            {"$set": fields},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def inc_user(self, user_id: str, deltas: Dict[str, int]) -> Optional[Dict]:
+        return await self._call(
+            "inc_user",
+            self.users.find_one_and_update,
+            {"_id": user_id},
+            {"$inc": deltas},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def find_user_by_referral_code(self, code: str) -> Optional[str]:
+        doc = await self._call(
+            "find_user_by_referral_code", self.users.find_one, {"referral_code": code}, {"_id": 1}
+        )
+        return doc["_id"] if doc else None
+
+    async def claim_referral(self, user_id: str, referrer_id: str) -> bool:
+        result = await self._call(
+            "claim_referral",
+            self.users.update_one,
+            {"_id": user_id, "referred_by": None},
+            {"$set": {"referred_by": referrer_id}},
+        )
+        return result.modified_count == 1
+
+    async def grant_start_bonus(self, user_id: str, amount: int) -> Optional[Dict]:
+        # Filtrdagi maydon o'zgaradi: eski yozuv olinib, yangisi shu yerda hisoblanadi
+        user = await self._call(
+            "grant_start_bonus",
+            self.users.find_one_and_update,
+            {"_id": user_id, "start_bonus_given": {"$ne": True}},
+            {
+                "$inc": {"balance": amount},
+                "$set": {"start_bonus_given": True},
+                "$unset": {"bonus_due_at": ""},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if user is None:
+            return None
+        user["balance"] = user.get("balance", 0) + amount
+        user["start_bonus_given"] = True
+        user.pop("bonus_due_at", None)
+        return user
+
+    async def pending_bonuses(self) -> List[Tuple[float, str]]:
+        docs = await self._call(
+            "pending_bonuses",
+            lambda: list(
+                self.users.find(
+                    {"bonus_due_at": {"$exists": True}, "start_bonus_given": {"$ne": True}},
+                    {"_id": 1, "bonus_due_at": 1},
+                )
+            )
+        )
+        return [(doc["bonus_due_at"], doc["_id"]) for doc in docs]
+
+    async def reserve_code(self, code: str) -> bool:
+        try:
+            await self._call("reserve_code", self.codes.insert_one, {"_id": code})
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def user_totals(self, top: int) -> Dict:
+        def run():
+            sums = next(self.users.aggregate([{"$group": {
+                "_id": None,
+                "users": {"$sum": 1},
+                "balance": {"$sum": "$balance"},
+                "referrals": {"$sum": "$referrals"},
+                "start_bonuses": {"$sum": {"$cond": ["$start_bonus_given", 1, 0]}},
+            }}]), {"users": 0, "balance": 0, "referrals": 0, "start_bonuses": 0})
+            sums.pop("_id", None)
+            leaders = self.users.find({"referrals": {"$gt": 0}}, {"_id": 1, "referrals": 1})
+            sums["top_referrers"] = [
+                [doc["_id"], doc["referrals"]] for doc in leaders.sort("referrals", -1).limit(top)
+            ]
+            return sums
+        return await self._call("user_totals", run)
+
+    async def iter_user_ids(
+        self, batch_size: int = 1000, cursor=None, active_only: bool = False
+    ) -> AsyncIterator[Tuple[List[str], object]]:
+        # Cursor - oxirgi qaytarilgan _id
+        last_id = cursor
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            docs = await self._call(
+                "iter_user_ids",
+                lambda: list(
+                    self.users.find(query, {"_id": 1, "blocked": 1}).sort("_id", 1).limit(batch_size)
+                )
+            )
+            if not docs:
+                return
+            last_id = docs[-1]["_id"]
+            yield [doc["_id"] for doc in docs if not (active_only and doc.get("blocked"))], last_id
+
+    async def get_meta(self, key: str):
+        doc = await self._call("get_meta", self.meta.find_one, {"_id": key})
+        return doc["value"] if doc else None
+
+    async def set_meta(self, key: str, value):
+        if value is None:
+            await self._call("set_meta", self.meta.delete_one, {"_id": key})
+        else:
+            await self._call("set_meta", self.meta.replace_one, {"_id": key}, {"value": value}, upsert=True)
+
+    # ---------- Kuponlar ----------
+    def load_games(self) -> Dict:
+        games = {}
+        with STORAGE_SECONDS.time(op="load_games", file="mongo"):
+            for doc in self.games.find({}):
+                games[doc.pop("_id")] = doc
+        return games
+
+    async def save_game(self, name: str, game: Dict):
+        await self._call("save_game", self.games.replace_one, {"_id": name}, dict(game), upsert=True)
+
+    async def delete_game(self, name: str):
+        await self._call("delete_game", self.games.delete_one, {"_id": name})
+
+    async def apply_games(self, upserts: Dict[str, Dict], deletes: List[str]):
+        operations = [DeleteOne({"_id": name}) for name in deletes]
+        operations += [ReplaceOne({"_id": name}, dict(game), upsert=True) for name, game in upserts.items()]
+        if operations:
+            await self._call("apply_games", self.games.bulk_write, operations, ordered=True)
+
+    async def archive_games(self, records: List[Dict]):
+        if records:
+            await self._call("archive_games", self.games_archive.insert_many, [dict(record) for record in records])
+
+    async def add_views(self, counts: Dict[str, int]):
+        if not counts:
+            return
+        operations = [UpdateOne({"_id": name}, {"$inc": {"views": count}}) for name, count in counts.items()]
+        await self._call("add_views", self.games.bulk_write, operations, ordered=False)
+
+    # ---------- APK ----------
+    def load_apk(self) -> Dict:
+        with STORAGE_SECONDS.time(op="load_apk", file="mongo"):
+            doc = self.meta.find_one({"_id": "apk"}, {"_id": 0})
+        return doc or {"file_id": None}
+
+    async def save_apk(self, apk_data: Dict):
+        await self._call("save_apk", self.meta.replace_one, {"_id": "apk"}, dict(apk_data), upsert=True)
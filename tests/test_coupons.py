@@ -0,0 +1,31 @@
+"""Kuponlar importi: vaqt maydonlarini tekshirish"""
+import json
+
+import pytest
+
+from coupons import export_coupons, parse_coupons, parse_time
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "Infinity", float("inf"), float("nan"), 1e20, "1e300"])
+def test_parse_time_rejects_non_finite_and_out_of_range(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+def test_parse_time_accepts_unix_and_iso():
+    assert parse_time("1800000000") == 1800000000.0
+    assert parse_time(1800000000) == 1800000000.0
+    assert parse_time("") is None
+    assert isinstance(parse_time("2026-10-18T09:00"), float)
+
+def test_bad_times_are_row_errors_and_export_still_works():
+    rows = [
+        {"name": "inf", "text": "A", "expire_at": "inf"},
+        {"name": "nan", "text": "B", "publish_at": "nan"},
+        {"name": "ok", "text": "C", "publish_at": "1800000000", "expire_at": 1800003600},
+    ]
+    upserts, deletes, errors = parse_coupons(json.dumps(rows).encode(), "coupons.json")
+    assert list(upserts) == ["ok"]
+    assert deletes == []
+    assert len(errors) == 2 and errors[0].startswith("1:") and errors[1].startswith("2:")
+    exported = json.loads(export_coupons(upserts, lambda name: 0))
+    assert exported[0]["name"] == "ok"
+    assert "expire_at" in exported[0]
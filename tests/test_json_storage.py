@@ -0,0 +1,138 @@
+"""JsonStorage: users.log jurnalini qayta o'qish va siqish"""
+import asyncio
+import json
+
+import pytest
+
+from storage import JsonStorage
+
+def make_storage(tmp_path, **kwargs) -> JsonStorage:
+    return JsonStorage(
+        str(tmp_path / "users.json"),
+        str(tmp_path / "users.log"),
+        str(tmp_path / "games.json"),
+        str(tmp_path / "apk.json"),
+        state_file=str(tmp_path / "state.json"),
+        users_bin_file=str(tmp_path / "users.bin"),
+        games_archive_file=str(tmp_path / "games_archive.jsonl"),
+        **kwargs,
+    )
+
+def write_log(path, records, tail: str = ""):
+    path.write_text("".join(json.dumps({"id": user_id, "data": data}) + "\n" for user_id, data in records) + tail)
+
+def test_replay_old_then_current_log(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps({
+        "1": {"balance": 0, "referral_code": "1111111"},
+        "2": {"balance": 5},
+    }))
+    # Tugallanmagan siqishdan qolgan users.log.old avval, keyin users.log qo'llanadi
+    write_log(tmp_path / "users.log.old", [
+        ("1", {"balance": 10, "referral_code": "1111111"}),
+        ("3", {"balance": 1, "referral_code": "3333333"}),
+    ])
+    write_log(tmp_path / "users.log", [
+        ("1", {"balance": 20, "referral_code": "1212121"}),
+        ("4", {"balance": 2}),
+    ], tail='{"id": "2", "da')  # chala qolgan oxirgi yozuv tashlab ketiladi
+    storage = make_storage(tmp_path)
+    assert dict(storage.users.items()) == {
+        "1": {"balance": 20, "referral_code": "1212121"},
+        "2": {"balance": 5},
+        "3": {"balance": 1, "referral_code": "3333333"},
+        "4": {"balance": 2},
+    }
+    assert storage.users_log_count == 4
+    assert storage.users.find_by_referral_code("1111111") is None
+    assert storage.users.find_by_referral_code("1212121") == "1"
+    assert "3333333" in storage.used_codes
+
+def test_wal_survives_restart_and_compaction(tmp_path):
+    async def first_run():
+        storage = make_storage(tmp_path, persist_delay=0.01)
+        await storage.start()
+        await storage.create_user("1", {"balance": 0, "referral_code": "1111111"})
+        await storage.create_user("2", {"balance": 0})
+        assert await storage.claim_referral("2", "1")
+        await storage.inc_user("1", {"balance": 500, "referrals": 1})
+        assert await storage.grant_start_bonus("2", 15000)
+        assert await storage.grant_start_bonus("2", 15000) is None
+        await storage.close()
+
+    asyncio.run(first_run())
+    expected = {
+        "1": {"balance": 500, "referral_code": "1111111", "referrals": 1},
+        "2": {"balance": 15000, "referred_by": "1", "start_bonus_given": True},
+    }
+    storage = make_storage(tmp_path)
+    assert dict(storage.users.items()) == expected
+
+    asyncio.run(storage.compact())
+    assert not (tmp_path / "users.log").exists()
+    assert not (tmp_path / "users.log.old").exists()
+    reloaded = make_storage(tmp_path)
+    assert dict(reloaded.users.items()) == expected
+    assert reloaded.users_log_count == 0
+    assert reloaded.users.find_by_referral_code("1111111") == "1"
+
+@pytest.mark.parametrize("wal", [True, False])
+def test_archive_lines_written_during_compaction(tmp_path, wal):
+    async def run():
+        storage = make_storage(tmp_path, persist_delay=0.01, wal=wal)
+        await storage.start()
+        await storage.create_user("1", {"balance": 0})
+        compaction = asyncio.create_task(storage.compact())
+        await asyncio.sleep(0)
+        await storage.archive_games([{"name": "a", "text": "A"}])
+        await compaction
+        await storage.close()
+
+    asyncio.run(run())
+    lines = (tmp_path / "games_archive.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [{"name": "a", "text": "A"}]
+    assert dict(make_storage(tmp_path).users.items()) == {"1": {"balance": 0}}
+
+def test_switching_wal_off_keeps_newer_writes(tmp_path):
+    async def session(wal, user_id=None, deltas=None):
+        storage = make_storage(tmp_path, persist_delay=0.01, wal=wal)
+        await storage.start()
+        if storage.compaction_task:
+            await storage.compaction_task  # users.bin yaratilishi; keyingi yozuvlar jurnalga tushadi
+        if user_id and user_id not in storage.users:
+            await storage.create_user(user_id, {"balance": 0})
+        if deltas:
+            await storage.inc_user(user_id, deltas)
+        await storage.close()
+
+    asyncio.run(session(True, "1", {"balance": 100}))
+    assert (tmp_path / "users.log").exists()
+    asyncio.run(session(False, "1", {"balance": 900}))
+    assert not (tmp_path / "users.log").exists()
+    assert not (tmp_path / "users.log.old").exists()
+    asyncio.run(session(False))
+    assert make_storage(tmp_path, wal=False).users.get("1") == {"balance": 1000}
+
+def test_switching_snapshot_format_loads_newest(tmp_path):
+    (tmp_path / "users.json").write_text(json.dumps({"1": {"balance": 1}}))
+
+    async def session(binary, new_users=()):
+        storage = make_storage(tmp_path, persist_delay=0.01, binary_snapshot=binary)
+        await storage.start()
+        for user_id in new_users:
+            await storage.create_user(user_id, {"balance": 0})
+        await storage.close()
+        return storage
+
+    asyncio.run(session(True, ["2", "3"]))
+    # Jurnal users.bin ga siqiladi; users.json eskirgan holda diskda qoladi
+    asyncio.run(make_storage(tmp_path).compact())
+    asyncio.run(session(True, ["4", "5"]))
+
+    storage = asyncio.run(session(False))
+    assert storage.loaded_snapshot == str(tmp_path / "users.bin")
+    assert sorted(storage.users.user_ids()) == ["1", "2", "3", "4", "5"]
+    # Siqish endi users.json ga yozgan: u eng yangi snapshot
+    assert json.loads((tmp_path / "users.json").read_text()).keys() == {"1", "2", "3", "4", "5"}
+    storage = asyncio.run(session(True, ["6"]))
+    assert storage.loaded_snapshot == str(tmp_path / "users.json")
+    assert sorted(make_storage(tmp_path).users.user_ids()) == ["1", "2", "3", "4", "5", "6"]
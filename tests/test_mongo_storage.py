@@ -0,0 +1,91 @@
+"""MongoStorage: jarayon ichidagi mongomock bilan"""
+import asyncio
+
+import pytest
+
+from storage import MongoStorage
+
+mongomock = pytest.importorskip("mongomock")
+
+@pytest.fixture
+def storage():
+    return MongoStorage("mongodb://fake", "test_bot", client=mongomock.MongoClient())
+
+def run(coro):
+    return asyncio.run(coro)
+
+def new_user(**fields):
+    return {"balance": 0, "referrals": 0, "referred_by": None, "start_bonus_given": False, **fields}
+
+def test_create_user_is_idempotent(storage):
+    created = run(storage.create_user("1", new_user(referral_code="1111111")))
+    assert created == new_user(referral_code="1111111")
+    again = run(storage.create_user("1", new_user(balance=99)))
+    assert again["balance"] == 0
+    assert run(storage.find_user_by_referral_code("1111111")) == "1"
+    assert run(storage.find_user_by_referral_code("9999999")) is None
+    assert run(storage.update_user("1", {"username": "ali"}))["username"] == "ali"
+    assert run(storage.inc_user("1", {"balance": 500, "referrals": 1}))["balance"] == 500
+    assert run(storage.update_user("404", {"username": "x"})) is None
+
+def test_claim_referral_only_once(storage):
+    run(storage.create_user("1", new_user()))
+    run(storage.create_user("2", new_user()))
+    assert run(storage.claim_referral("2", "1"))
+    assert not run(storage.claim_referral("2", "3"))
+    assert not run(storage.claim_referral("404", "1"))
+    assert run(storage.get_user("2"))["referred_by"] == "1"
+
+def test_grant_start_bonus_only_once(storage):
+    run(storage.create_user("1", new_user(bonus_due_at=100.0)))
+    run(storage.create_user("2", new_user(bonus_due_at=200.0)))
+    assert sorted(run(storage.pending_bonuses())) == [(100.0, "1"), (200.0, "2")]
+    granted = run(storage.grant_start_bonus("1", 15000))
+    assert granted["balance"] == 15000
+    assert granted["start_bonus_given"] is True
+    assert "bonus_due_at" not in granted
+    assert run(storage.grant_start_bonus("1", 15000)) is None
+    assert run(storage.get_user("1"))["balance"] == 15000
+    assert run(storage.pending_bonuses()) == [(200.0, "2")]
+
+def test_reserve_code(storage):
+    assert run(storage.reserve_code("1234567"))
+    assert not run(storage.reserve_code("1234567"))
+
+def test_iter_user_ids_resumes_from_cursor(storage):
+    for i in range(5):
+        run(storage.create_user(f"u{i}", new_user(blocked=(i == 2))))
+
+    async def collect(cursor=None, active_only=False):
+        batches = []
+        async for ids, cursor in storage.iter_user_ids(batch_size=2, cursor=cursor, active_only=active_only):
+            batches.append((ids, cursor))
+        return batches
+
+    batches = run(collect())
+    assert batches == [(["u0", "u1"], "u1"), (["u2", "u3"], "u3"), (["u4"], "u4")]
+    assert [ids for ids, _ in run(collect(cursor="u1"))] == [["u2", "u3"], ["u4"]]
+    assert [ids for ids, _ in run(collect(active_only=True))] == [["u0", "u1"], ["u3"], ["u4"]]
+
+def test_apply_games_archive_and_views(storage):
+    run(storage.save_game("a", {"id": 1, "text": "A", "views": 0}))
+    run(storage.save_game("b", {"id": 2, "text": "B", "views": 0}))
+    run(storage.apply_games({"c": {"id": 3, "text": "C"}, "a": {"id": 1, "text": "A2", "views": 0}}, ["b"]))
+    run(storage.add_views({"a": 3}))
+    assert storage.load_games() == {
+        "a": {"id": 1, "text": "A2", "views": 3},
+        "c": {"id": 3, "text": "C"},
+    }
+    run(storage.archive_games([{"name": "b", "id": 2, "views": 7}]))
+    assert list(storage.games_archive.find({}, {"_id": 0})) == [{"name": "b", "id": 2, "views": 7}]
+
+def test_meta_and_totals(storage):
+    run(storage.set_meta("next_game_id", 4))
+    assert run(storage.get_meta("next_game_id")) == 4
+    run(storage.set_meta("next_game_id", None))
+    assert run(storage.get_meta("next_game_id")) is None
+    run(storage.create_user("1", new_user(balance=10, referrals=2, start_bonus_given=True)))
+    run(storage.create_user("2", new_user(balance=5, referrals=1)))
+    assert run(storage.user_totals(top=1)) == {
+        "users": 2, "balance": 15, "referrals": 3, "start_bonuses": 1, "top_referrers": [["1", 2]],
+    }
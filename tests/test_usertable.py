@@ -0,0 +1,83 @@
+"""UserTable: users.json <-> jadval <-> users.bin aylanishi va referral indeksi"""
+import json
+
+import pytest
+
+from usertable import UserTable, convert, load_binary, save_binary
+
+USERS = {
+    "1000000001": {
+        "balance": 15000, "referred_by": "1000000002", "referrals": 3, "referral_code": "1234567",
+        "start_bonus_given": True, "username": "ali", "first_name": "Ali", "joined_at": 1700000000.5,
+    },
+    "1000000002": {"balance": 0, "referral_code": "0000042", "withdraw_code": "7654321", "blocked": True},
+    # Standart kodlashga tushmaydiganlar extra ga tushadi
+    "1000000003": {
+        "balance": "100", "referral_code": "ABC", "first_name": "Ōzbek 🇺🇿",
+        "custom": {"nested": [1, 2]}, "bonus_due_at": 1700000090.0,
+    },
+    "1000000004": {"balance": 2 ** 70, "referrals": -1, "username": None},
+    "abc": {"balance": 5, "referral_code": "7777777"},  # raqamli bo'lmagan id
+    "0123": {"balance": 1},                            # boshida nol - int emas
+}
+
+@pytest.fixture
+def table():
+    return UserTable.from_dict(json.loads(json.dumps(USERS)))
+
+def test_records_round_trip(table):
+    assert len(table) == len(USERS)
+    for user_id, data in USERS.items():
+        assert table.get(user_id) == data
+    assert dict(table.items()) == USERS
+
+def test_iter_json_round_trip(table):
+    assert json.loads("".join(table.iter_json(batch_size=2))) == USERS
+
+def test_binary_round_trip(table, tmp_path):
+    path = str(tmp_path / "users.bin")
+    save_binary(path, table)
+    loaded = load_binary(path)
+    assert dict(loaded.items()) == USERS
+    for user_id, data in USERS.items():
+        assert loaded.get(user_id) == data
+    assert loaded.find_by_referral_code("1234567") == "1000000001"
+    assert loaded.find_by_referral_code("ABC") == "1000000003"
+    assert loaded.find_by_referral_code("7777777") == "abc"
+    assert sorted(loaded.code_keys(), key=repr) == sorted(table.code_keys(), key=repr)
+    assert loaded.pending_bonuses() == [(1700000090.0, "1000000003")]
+
+def test_snapshot_is_independent(table, tmp_path):
+    snapshot = table.snapshot()
+    table.update("1000000001", {"username": "vali", "balance": 1})
+    table.set("1000000005", {"balance": 7})
+    path = str(tmp_path / "users.bin")
+    save_binary(path, snapshot)
+    assert dict(load_binary(path).items()) == USERS
+
+def test_convert(tmp_path):
+    json_path, bin_path = tmp_path / "users.json", tmp_path / "users.bin"
+    json_path.write_text(json.dumps(USERS))
+    assert convert(str(json_path), str(bin_path)) == len(USERS)
+    assert dict(load_binary(str(bin_path)).items()) == USERS
+
+def test_referral_index_follows_updates(table):
+    table.update("1000000001", {"referral_code": "1111111"})
+    assert table.find_by_referral_code("1234567") is None
+    assert table.find_by_referral_code("1111111") == "1000000001"
+    # Kod extra dan oddiy ustunga o'tadi
+    table.update("1000000003", {"referral_code": "2222222"})
+    assert table.find_by_referral_code("ABC") is None
+    assert table.find_by_referral_code("2222222") == "1000000003"
+    table.set("abc", {"balance": 0})
+    assert table.find_by_referral_code("7777777") is None
+    table.set("1000000006", {"referral_code": "7777777"})
+    assert table.find_by_referral_code("7777777") == "1000000006"
+
+def test_inc_and_pop(table):
+    table.inc("1000000002", {"balance": 500, "referrals": 1})
+    table.pop("1000000003", "bonus_due_at")
+    assert table.field("1000000002", "balance") == 500
+    assert table.field("1000000002", "referrals") == 1
+    assert "bonus_due_at" not in table.get("1000000003")
+    assert table.pending_bonuses() == []
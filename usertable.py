@@ -0,0 +1,562 @@
+"""Foydalanuvchilar uchun ixcham xotira jadvali.
+
+Har bir foydalanuvchi alohida dict sifatida saqlanmaydi: maydonlar turiga qarab
+array/bytearray ustunlarida turadi, qator raqami esa user_id (int) bo'yicha
+topiladi. Standart kodlashga tushmaydigan qiymatlar (notanish maydonlar,
+g'ayrioddiy formatlar) qatorning `extra` lug'atiga tushadi, shuning uchun
+users.json dagi yozuv o'zgarmasdan qayta tiklanadi.
+
+Jadval users.bin binar snapshotiga ustunlar bo'yicha yoziladi va undan
+array.fromfile bilan tez yuklanadi; matnli ustunlar esa qator so'ralgandagina
+decode qilinadi. users.json -> users.bin konvertori:
+
+    python usertable.py users.json users.bin
+"""
+import argparse
+import heapq
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# Maydonlar users.json dagi tartibda; har biriga mask ichida bitta bit
+FIELDS = (
+    "balance", "referred_by", "referrals", "referral_code", "start_bonus_given",
+    "withdraw_code", "username", "first_name", "joined_at", "blocked", "bonus_due_at",
+)
+BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+FLAG_BITS = {"start_bonus_given": 1, "blocked": 2}
+
+INT_FIELDS = ("balance", "referrals")
+CODE_FIELDS = ("referral_code", "withdraw_code")
+TEXT_FIELDS = ("username", "first_name")
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+# users.bin: MAGIC, sarlavha uzunligi (4 bayt), JSON sarlavha, keyin bo'limlar ketma-ket
+MAGIC = b"YBUSERS1"
+ARRAY_COLUMNS = (
+    "ids", "mask", "balance", "referrals", "referred_by",
+    "referral_code", "withdraw_code", "joined_at", "bonus_due_at",
+)
+
+def encode_code(code) -> Optional[int]:
+    """'0012345' -> 12345; 7 xonali bo'lmagan kodlar uchun None"""
+    if type(code) is str and len(code) == 7 and code.isascii() and code.isdigit():
+        return int(code)
+    return None
+
+def encode_user_id(user_id) -> Optional[int]:
+    """'123' -> 123; kanonik musbat son bo'lmasa None"""
+    if (
+        type(user_id) is str and 0 < len(user_id) < 19 and user_id.isascii()
+        and user_id.isdigit() and user_id[0] != "0"
+    ):
+        return int(user_id)
+    return None
+
+def code_key(code):
+    """Kodning ichki kaliti: 7 xonali kod -> int, boshqalari o'zicha"""
+    value = encode_code(code)
+    return code if value is None else value
+
+class CodeSet:
+    """Band qilingan kodlar: 7 xonali kodlar bitmapda (1.25 MB), qolganlari oddiy setda"""
+
+    def __init__(self):
+        self.bits = bytearray(10 ** 7 // 8)
+        self.other = set()
+        self.count = 0
+
+    def __contains__(self, code) -> bool:
+        value = encode_code(code)
+        if value is None:
+            return code in self.other
+        return bool(self.bits[value >> 3] & (1 << (value & 7)))
+
+    def add(self, code):
+        self.add_key(code_key(code))
+
+    def add_key(self, key):
+        """code_key() natijasini qo'shish (ustundagi int qiymatlar uchun tez yo'l)"""
+        if type(key) is int:
+            bit = 1 << (key & 7)
+            if self.bits[key >> 3] & bit:
+                return
+            self.bits[key >> 3] |= bit
+        else:
+            if key in self.other:
+                return
+            self.other.add(key)
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+class TextColumn:
+    """Matnli ustun (username, first_name).
+
+    users.bin dan kelgan qatorlar bitta blobda turadi va faqat so'ralganda
+    decode qilinadi; o'zgartirilgan va yangi qo'shilgan qatorlar oddiy str/None.
+    Blobda None - bo'sh bo'lak, str - b"\\x01" + utf-8.
+    """
+
+    def __init__(self, blob: bytes = b"", offsets: Optional[array] = None):
+        self.blob = blob
+        self.offsets = offsets if offsets is not None else array("Q", [0])
+        self.base = len(self.offsets) - 1          # blobdagi qatorlar soni
+        self.changed: Dict[int, Optional[str]] = {}  # blobdagi qator -> yangi qiymat
+        self.tail: List[Optional[str]] = []          # blobdan keyin qo'shilgan qatorlar
+
+    def __len__(self) -> int:
+        return self.base + len(self.tail)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if row >= self.base:
+            return self.tail[row - self.base]
+        if row in self.changed:
+            return self.changed[row]
+        start, end = self.offsets[row], self.offsets[row + 1]
+        if start == end:
+            return None
+        return self.blob[start + 1:end].decode()
+
+    def __setitem__(self, row: int, value: Optional[str]):
+        if row >= self.base:
+            self.tail[row - self.base] = value
+        else:
+            self.changed[row] = value
+
+    def append(self, value: Optional[str]):
+        self.tail.append(value)
+
+    def copy(self) -> "TextColumn":
+        """Nusxa: blob va offsets umumiy (ular o'zgarmaydi), qolgani ko'chiriladi"""
+        copy = TextColumn.__new__(TextColumn)
+        copy.blob, copy.offsets, copy.base = self.blob, self.offsets, self.base
+        copy.changed = dict(self.changed)
+        copy.tail = self.tail[:]
+        return copy
+
+    def encode(self) -> Tuple[array, bytes]:
+        """Butun ustunni (offsets, blob) ko'rinishiga keltirish"""
+        offsets = array("Q", [0])
+        parts = []
+        size = 0
+        for row in range(len(self)):
+            value = self[row]
+            if value is not None:
+                part = b"\x01" + value.encode()
+                parts.append(part)
+                size += len(part)
+            offsets.append(size)
+        return offsets, b"".join(parts)
+
+class UserTable:
+    """user_id (str) -> foydalanuvchi yozuvi (dict) jadvali, ustunlar ko'rinishida.
+
+    get() har safar yangi dict qaytaradi; uni o'zgartirish jadvalga taʼsir
+    qilmaydi, o'zgarishlar set/update/inc/pop orqali kiritiladi. Qatorlar
+    qo'shilish tartibida turadi va o'chirilmaydi.
+    """
+
+    def __init__(self):
+        self.ids = array("q")                     # qator -> user_id (manfiy: text_ids dagi o'rin)
+        self.text_ids: List[str] = []             # raqam bo'lmagan user_id lar
+        self.mask = array("H")                    # qator -> ustunlarda mavjud maydonlar bitlari
+        self.flags = bytearray()                  # qator -> FLAG_BITS qiymatlari
+        self.balance = array("q")
+        self.referrals = array("q")
+        self.referred_by = array("q")             # 0 - None
+        self.referral_code = array("i")
+        self.withdraw_code = array("i")
+        self.joined_at = array("d")               # str(float) sifatida saqlanadi
+        self.bonus_due_at = array("d")
+        self.username = TextColumn()
+        self.first_name = TextColumn()            # yangi qiymatlar intern qilinadi (ismlar ko'p takrorlanadi)
+        self.extra: Dict[int, Dict] = {}          # qator -> ustunga tushmagan maydonlar
+        self.rows: Dict[object, int] = {}         # user_id (int yoki str) -> qator
+        self.referral_rows: Dict[object, int] = {}  # referral kodi (int yoki str) -> qator
+
+    @classmethod
+    def from_dict(cls, users: Dict[str, Dict]) -> "UserTable":
+        table = cls()
+        for user_id, data in users.items():
+            table.set(user_id, data)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._row(user_id) is not None
+
+    # ---------- Kalitlar ----------
+    @staticmethod
+    def _key(user_id: str):
+        key = encode_user_id(user_id)
+        return user_id if key is None else key
+
+    def _row(self, user_id: str) -> Optional[int]:
+        return self.rows.get(self._key(user_id))
+
+    def _user_id(self, row: int) -> str:
+        value = self.ids[row]
+        return str(value) if value >= 0 else self.text_ids[-value - 1]
+
+    _code_key = staticmethod(code_key)
+
+    def _append(self, key) -> int:
+        row = len(self.mask)
+        if type(key) is int:
+            self.ids.append(key)
+        else:
+            self.text_ids.append(key)
+            self.ids.append(-len(self.text_ids))
+        self.mask.append(0)
+        self.flags.append(0)
+        for column in (self.balance, self.referrals, self.referred_by):
+            column.append(0)
+        self.referral_code.append(0)
+        self.withdraw_code.append(0)
+        self.joined_at.append(0.0)
+        self.bonus_due_at.append(0.0)
+        self.username.append(None)
+        self.first_name.append(None)
+        self.rows[key] = row
+        return row
+
+    # ---------- Maydonlarni kodlash ----------
+    def _encode(self, row: int, name: str, value) -> bool:
+        """Qiymatni ustunga yozish; ustun formatiga tushmasa False"""
+        if name in INT_FIELDS:
+            if type(value) is not int or not INT64_MIN <= value <= INT64_MAX:
+                return False
+            getattr(self, name)[row] = value
+        elif name in CODE_FIELDS:
+            code = encode_code(value)
+            if code is None:
+                return False
+            getattr(self, name)[row] = code
+        elif name in FLAG_BITS:
+            if type(value) is not bool:
+                return False
+            if value:
+                self.flags[row] |= FLAG_BITS[name]
+            else:
+                self.flags[row] &= ~FLAG_BITS[name]
+        elif name in TEXT_FIELDS:
+            if value is not None and type(value) is not str:
+                return False
+            if name == "first_name" and value is not None:
+                value = sys.intern(value)
+            getattr(self, name)[row] = value
+        elif name == "referred_by":
+            user_id = encode_user_id(value) if value is not None else 0
+            if user_id is None:
+                return False
+            self.referred_by[row] = user_id
+        elif name == "joined_at":
+            if type(value) is not str:
+                return False
+            try:
+                stamp = float(value)
+            except ValueError:
+                return False
+            if repr(stamp) != value:
+                return False
+            self.joined_at[row] = stamp
+        elif name == "bonus_due_at":
+            if type(value) is not float:
+                return False
+            self.bonus_due_at[row] = value
+        else:
+            return False
+        return True
+
+    def _decode(self, row: int, name: str):
+        if name in FLAG_BITS:
+            return bool(self.flags[row] & FLAG_BITS[name])
+        if name in CODE_FIELDS:
+            return f"{getattr(self, name)[row]:07d}"
+        if name == "referred_by":
+            value = self.referred_by[row]
+            return str(value) if value else None
+        if name == "joined_at":
+            return repr(self.joined_at[row])
+        return getattr(self, name)[row]
+
+    def _value(self, row: int, name: str, default=None):
+        bit = BITS.get(name)
+        if bit is not None and self.mask[row] & bit:
+            return self._decode(row, name)
+        extra = self.extra.get(row)
+        if extra is not None:
+            return extra.get(name, default)
+        return default
+
+    def _discard(self, row: int, name: str):
+        """Maydonni qatordan olib tashlash (ustundan ham, extra dan ham)"""
+        bit = BITS.get(name)
+        if bit is not None and self.mask[row] & bit:
+            if name == "referral_code":
+                self._unindex_referral(row, self._decode(row, name))
+            self.mask[row] &= ~bit
+        extra = self.extra.get(row)
+        if extra is not None and name in extra:
+            if name == "referral_code":
+                self._unindex_referral(row, extra[name])
+            del extra[name]
+            if not extra:
+                del self.extra[row]
+
+    def _unindex_referral(self, row: int, code):
+        key = self._code_key(code)
+        if self.referral_rows.get(key) == row:
+            del self.referral_rows[key]
+
+    def _put(self, row: int, name: str, value):
+        self._discard(row, name)
+        bit = BITS.get(name)
+        if bit is not None and self._encode(row, name, value):
+            self.mask[row] |= bit
+        else:
+            self.extra.setdefault(row, {})[name] = value
+        if name == "referral_code" and value:
+            self.referral_rows[self._code_key(value)] = row
+
+    def _record(self, row: int) -> Dict:
+        mask = self.mask[row]
+        data = {name: self._decode(row, name) for name in FIELDS if mask & BITS[name]}
+        extra = self.extra.get(row)
+        if extra:
+            data.update(extra)
+        return data
+
+    # ---------- Yozuvlar ----------
+    def get(self, user_id: str) -> Optional[Dict]:
+        row = self._row(user_id)
+        return None if row is None else self._record(row)
+
+    def field(self, user_id: str, name: str, default=None):
+        """Bitta maydonni butun yozuvni yig'masdan o'qish"""
+        row = self._row(user_id)
+        return default if row is None else self._value(row, name, default)
+
+    def set(self, user_id: str, data: Dict):
+        """Yozuvni to'liq almashtirish (yo'q bo'lsa yaratish)"""
+        key = self._key(user_id)
+        row = self.rows.get(key)
+        if row is None:
+            row = self._append(key)
+        else:
+            for name in list(self._record(row)):
+                self._discard(row, name)
+            self.flags[row] = 0
+        for name, value in data.items():
+            self._put(row, name, value)
+
+    def update(self, user_id: str, fields: Dict) -> bool:
+        row = self._row(user_id)
+        if row is None:
+            return False
+        for name, value in fields.items():
+            self._put(row, name, value)
+        return True
+
+    def inc(self, user_id: str, deltas: Dict[str, int]) -> bool:
+        row = self._row(user_id)
+        if row is None:
+            return False
+        for name, delta in deltas.items():
+            self._put(row, name, self._value(row, name, 0) + delta)
+        return True
+
+    def pop(self, user_id: str, name: str):
+        row = self._row(user_id)
+        if row is not None:
+            self._discard(row, name)
+
+    def code_keys(self) -> Iterator:
+        """Barcha referral va withdraw kodlarining code_key() lari (yozuvlarni yig'masdan)"""
+        for name in CODE_FIELDS:
+            bit, column = BITS[name], getattr(self, name)
+            for row, mask in enumerate(self.mask):
+                if mask & bit:
+                    yield column[row]
+        for extra in self.extra.values():
+            for name in CODE_FIELDS:
+                if extra.get(name):
+                    yield self._code_key(extra[name])
+
+    def find_by_referral_code(self, code: str) -> Optional[str]:
+        row = self.referral_rows.get(self._code_key(code))
+        return None if row is None else self._user_id(row)
+
+    # ---------- Ko'rib chiqish ----------
+    def user_ids(self, start: int = 0, stop: Optional[int] = None, active_only: bool = False) -> List[str]:
+        """Qo'shilish tartibidagi [start, stop) qatorlarning user_id lari"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        rows = range(start, stop)
+        if active_only:
+            rows = [row for row in rows if not self._value(row, "blocked")]
+        return [self._user_id(row) for row in rows]
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        for row in range(len(self)):
+            yield self._user_id(row), self._record(row)
+
+    def pending_bonuses(self) -> List[Tuple[float, str]]:
+        """bonus_due_at o'rnatilgan, lekin bonusi berilmagan foydalanuvchilar"""
+        due_bit = BITS["bonus_due_at"]
+        candidates = [row for row, mask in enumerate(self.mask) if mask & due_bit]
+        candidates.extend(row for row, extra in self.extra.items() if "bonus_due_at" in extra)
+        return [
+            (self._value(row, "bonus_due_at"), self._user_id(row))
+            for row in candidates
+            if not self._value(row, "start_bonus_given", False)
+        ]
+
+    def totals(self, top: int) -> Dict:
+        """Storage.user_totals uchun butun jadval bo'yicha bitta o'tish"""
+        balance = referrals = start_bonuses = 0
+        leaders = []
+        for row in range(len(self)):
+            balance += self._value(row, "balance", 0)
+            count = self._value(row, "referrals", 0)
+            referrals += count
+            if self._value(row, "start_bonus_given", False):
+                start_bonuses += 1
+            if count > 0:
+                leaders.append((count, row))
+        return {
+            "users": len(self),
+            "balance": balance,
+            "referrals": referrals,
+            "start_bonuses": start_bonuses,
+            "top_referrers": [[self._user_id(row), count] for count, row in heapq.nlargest(top, leaders)],
+        }
+
+    # ---------- Saqlash ----------
+    def snapshot(self) -> "UserTable":
+        """Diskka yozish uchun ustunlar nusxasi (indekslarsiz, tez: massivlar bir martada ko'chiriladi)"""
+        copy = UserTable.__new__(UserTable)
+        for name, value in self.__dict__.items():
+            if name in ("rows", "referral_rows"):
+                copy.__dict__[name] = {}
+            elif name == "extra":
+                copy.extra = {row: dict(extra) for row, extra in value.items()}
+            elif isinstance(value, TextColumn):
+                copy.__dict__[name] = value.copy()
+            else:
+                copy.__dict__[name] = value[:]
+        return copy
+
+    def iter_json(self, batch_size: int = 1000) -> Iterator[str]:
+        """json.dumps({user_id: yozuv, ...}) bilan bir xil matnni bo'laklab berish"""
+        yield "{"
+        for start in range(0, len(self), batch_size):
+            chunk = ", ".join(
+                f"{json.dumps(self._user_id(row))}: {json.dumps(self._record(row))}"
+                for row in range(start, min(start + batch_size, len(self)))
+            )
+            yield chunk if start == 0 else ", " + chunk
+        yield "}"
+
+    def write_binary(self, f: BinaryIO):
+        """Jadvalni users.bin formatida yozish"""
+        sections = [(name, getattr(self, name)) for name in ARRAY_COLUMNS]
+        sections.append(("flags", bytes(self.flags)))
+        for name in TEXT_FIELDS:
+            offsets, blob = getattr(self, name).encode()
+            sections += [(name + ".offsets", offsets), (name, blob)]
+        sections.append(("text_ids", json.dumps(self.text_ids).encode()))
+        sections.append(("extra", json.dumps(self.extra).encode()))
+        header = json.dumps({
+            "byteorder": sys.byteorder,
+            "rows": len(self),
+            "sections": [
+                [name, data.itemsize * len(data) if isinstance(data, array) else len(data)]
+                for name, data in sections
+            ],
+        }).encode()
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for _, data in sections:
+            if isinstance(data, array):
+                data.tofile(f)
+            else:
+                f.write(data)
+
+    @classmethod
+    def read_binary(cls, f: BinaryIO) -> "UserTable":
+        """users.bin ni o'qish: ustunlar to'g'ridan-to'g'ri massivlarga, matnlar blob holida"""
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("users.bin formati noto'g'ri")
+        (size,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size))
+        swap = header["byteorder"] != sys.byteorder
+        table = cls()
+        raw = {}
+        for name, length in header["sections"]:
+            column = getattr(table, name, None) if name in ARRAY_COLUMNS else None
+            if column is None and name.endswith(".offsets"):
+                column = raw[name] = array("Q")
+            if column is None:
+                raw[name] = f.read(length)
+                if len(raw[name]) != length:
+                    raise EOFError(f"users.bin chala: {name}")
+                continue
+            column.fromfile(f, length // column.itemsize)
+            if swap:
+                column.byteswap()
+        table.flags = bytearray(raw["flags"])
+        for name in TEXT_FIELDS:
+            setattr(table, name, TextColumn(raw[name], raw[name + ".offsets"]))
+        table.text_ids = json.loads(raw["text_ids"])
+        table.extra = {int(row): extra for row, extra in json.loads(raw["extra"]).items()}
+        if any(len(column) != header["rows"] for column in (table.mask, table.flags, table.username)):
+            raise ValueError("users.bin ustunlari uzunligi mos emas")
+        table._build_index()
+        return table
+
+    def _build_index(self):
+        """rows va referral_rows indekslarini ustunlardan qurish"""
+        text_ids = self.text_ids
+        self.rows = {
+            (value if value >= 0 else text_ids[-value - 1]): row for row, value in enumerate(self.ids)
+        }
+        bit, codes = BITS["referral_code"], self.referral_code
+        self.referral_rows = {codes[row]: row for row, mask in enumerate(self.mask) if mask & bit}
+        for row, extra in self.extra.items():
+            if extra.get("referral_code"):
+                self.referral_rows[self._code_key(extra["referral_code"])] = row
+
+def save_binary(path: str, table: UserTable):
+    """users.bin ni atomar yozish"""
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        table.write_binary(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+def load_binary(path: str) -> UserTable:
+    with open(path, "rb") as f:
+        return UserTable.read_binary(f)
+
+def convert(json_path: str, bin_path: str) -> int:
+    """users.json -> users.bin, foydalanuvchilar sonini qaytaradi"""
+    with open(json_path, "r") as f:
+        table = UserTable.from_dict(json.load(f))
+    save_binary(bin_path, table)
+    return len(table)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="users.json ni users.bin binar snapshotiga o'tkazish")
+    parser.add_argument("source", nargs="?", default="users.json")
+    parser.add_argument("target", nargs="?", default="users.bin")
+    args = parser.parse_args()
+    print(f"{convert(args.source, args.target)} foydalanuvchi -> {args.target}")